@@ -3,6 +3,7 @@ import os
 import yaml
 import logging
 from src.data_pipeline_v15.pipeline_orchestrator import PipelineOrchestrator
+from src.sp_data_v16.core.config import YAML_SAFE_LOADER
 
 # --- 全域設定 ---
 CONFIG_FILE = "config.yaml"
@@ -11,7 +12,7 @@ def load_config():
     """載入設定檔"""
     try:
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=YAML_SAFE_LOADER)
     except FileNotFoundError:
         logging.warning(f"警告: 設定檔 {CONFIG_FILE} 未找到。將使用預設值。")
         return {}
@@ -33,6 +33,7 @@ from .manifest_manager import ManifestManager
 from .data_validator import Validator # Import Validator
 from .utils.logger import setup_logger
 from .utils.monitor import get_hardware_usage
+from src.sp_data_v16.core.config import YAML_SAFE_LOADER
 
 
 class PipelineOrchestrator:
@@ -256,7 +257,7 @@ class PipelineOrchestrator:
         """載入 YAML 設定檔"""
         try:
             with open(config_file_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=YAML_SAFE_LOADER)
         except FileNotFoundError:
             # Logger might not be initialized yet if this is called early.
             # Consider logging this error after logger setup, or print.
@@ -1,11 +1,71 @@
+import hashlib
+import json
+import os
 import yaml
 
+# libyaml's C loader parses several times faster; PyYAML builds without it fall back.
+# Shared by every YAML config reader in the repo.
+YAML_SAFE_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Suffix of the JSON sidecar holding the last parsed copy of a YAML config
+CONFIG_CACHE_SUFFIX = ".json.cache"
+# Set this environment variable to "1" to enable the sidecar cache; it is off by default
+CONFIG_CACHE_ENV_VAR = "SP_DATA_CONFIG_CACHE"
+
+def _read_config_cache(cache_path: str, content_hash: str) -> dict | None:
+    """
+    Reads the JSON sidecar if it was written for the current content of the config.
+
+    Args:
+        cache_path: Path of the JSON sidecar.
+        content_hash: SHA256 hex digest of the YAML file's bytes.
+
+    Returns:
+        The cache entry ({"sha256": ..., "config": ...}), or None if it is missing,
+        unreadable or stale.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("sha256") != content_hash or "config" not in entry:
+        return None
+    return entry
+
+def _write_config_cache(cache_path: str, content_hash: str, config) -> None:
+    """
+    Atomically writes the JSON sidecar. Configs that JSON cannot represent exactly
+    (e.g. dates or non-string keys) are not cached, and write failures are ignored.
+
+    Args:
+        cache_path: Path of the JSON sidecar.
+        content_hash: SHA256 hex digest of the YAML file's bytes.
+        config: The parsed configuration.
+    """
+    try:
+        payload = json.dumps({"sha256": content_hash, "config": config})
+        if json.loads(payload)["config"] != config:
+            return
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except (TypeError, ValueError, OSError):
+        return
+
 def load_config(config_path: str = "config_v16.yaml") -> dict:
     """
     Loads configuration from a YAML file.
 
+    When the SP_DATA_CONFIG_CACHE environment variable is "1", the parsed result is
+    cached in a JSON sidecar (config_path + ".json.cache") keyed on the SHA256 of the
+    YAML bytes, so unchanged configs skip YAML parsing. The cache is off by default.
+    Files ending in ".json" (e.g. machine-generated configs) are read with the json
+    module directly, which is faster than any YAML parse, and are not cached.
+
     Args:
-        config_path: Path to the YAML configuration file.
+        config_path: Path to the YAML (or JSON) configuration file.
                      Defaults to "config_v16.yaml" in the project root.
 
     Returns:
@@ -13,14 +73,35 @@ def load_config(config_path: str = "config_v16.yaml") -> dict:
 
     Raises:
         FileNotFoundError: If the configuration file is not found.
+        json.JSONDecodeError: If a ".json" configuration file is malformed.
     """
+    if str(config_path).endswith(".json"):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Configuration file not found at: {config_path}")
+
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config
+        with open(config_path, 'rb') as f:
+            raw_config = f.read()
     except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file not found at: {config_path}")
 
+    use_cache = os.environ.get(CONFIG_CACHE_ENV_VAR) == "1"
+    if use_cache:
+        cache_path = f"{config_path}{CONFIG_CACHE_SUFFIX}"
+        content_hash = hashlib.sha256(raw_config).hexdigest()
+        entry = _read_config_cache(cache_path, content_hash)
+        if entry is not None:
+            return entry["config"]
+
+    config = yaml.load(raw_config.decode('utf-8'), Loader=YAML_SAFE_LOADER)
+
+    if use_cache:
+        _write_config_cache(cache_path, content_hash, config)
+    return config
+
 if __name__ == '__main__':
     # Example usage (optional, for direct testing of this script)
     try:
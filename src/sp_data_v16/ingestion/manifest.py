@@ -1,32 +1,62 @@
 import duckdb
 import datetime
+import os
+import pandas as pd
 
 class ManifestManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, con: duckdb.DuckDBPyConnection | None = None):
         """
         Initializes the ManifestManager with a connection to a DuckDB database.
 
         Args:
             db_path: Path to the DuckDB database file.
+            con: An already open connection to that database. When given, it is used
+                instead of opening a new one, and close() leaves it open for its owner.
         """
         self.db_path = db_path
-        # Connect to the database. If the file doesn't exist, it will be created.
-        self.con = duckdb.connect(database=self.db_path, read_only=False)
+        self._owns_connection = con is None
+        if con is not None:
+            self.con = con
+        else:
+            # Connect to the database. If the file doesn't exist, it will be created.
+            self.con = duckdb.connect(database=self.db_path, read_only=False)
         self._initialize_schema()
 
     def _initialize_schema(self):
         """
         Initializes the 'file_manifest' table in the database if it doesn't exist.
+
+        Also creates the 'path_cache' table, which remembers the hash of each scanned
+        path together with its modification time and size.
+
+        The existence check is a plain read, so opening an existing manifest does not
+        start a write transaction for the DDL. It only counts tables of the current
+        database, since a shared connection may have other databases attached.
         """
-        create_table_sql = """
+        existing_tables = self.con.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE database_name = current_database() "
+            "AND schema_name = 'main' AND table_name IN ('file_manifest', 'path_cache');"
+        ).fetchone()[0]
+        if existing_tables == 2:
+            return
+        # Tables and the status index (used by the transformation stage's pending-file
+        # lookup) are created in a single multi-statement execute
+        create_schema_sql = """
         CREATE TABLE IF NOT EXISTS file_manifest (
             file_hash VARCHAR PRIMARY KEY,
             file_path VARCHAR,
             registration_timestamp TIMESTAMP DEFAULT current_timestamp,
             status VARCHAR DEFAULT 'registered'
         );
+        CREATE INDEX IF NOT EXISTS ix_file_manifest_status ON file_manifest (status);
+        CREATE TABLE IF NOT EXISTS path_cache (
+            source_path VARCHAR PRIMARY KEY,
+            mtime_ns BIGINT,
+            size BIGINT,
+            file_hash VARCHAR
+        );
         """
-        self.con.execute(create_table_sql)
+        self.con.execute(create_schema_sql)
         self.con.commit() # Commit schema changes
 
     def hash_exists(self, file_hash: str) -> bool:
@@ -39,9 +69,28 @@ class ManifestManager:
         Returns:
             True if the hash exists, False otherwise.
         """
-        query = "SELECT COUNT(*) FROM file_manifest WHERE file_hash = ?;"
-        result = self.con.execute(query, [file_hash]).fetchone()
-        return result[0] > 0 if result else False
+        query = "SELECT 1 FROM file_manifest WHERE file_hash = ?;"
+        return self.con.execute(query, [file_hash]).fetchone() is not None
+
+    def filter_new_hashes(self, file_hashes: list[str]) -> set[str]:
+        """
+        Returns the hashes from a batch that are not yet in the 'file_manifest' table,
+        using one semi-join over the batch instead of one query per file.
+
+        Args:
+            file_hashes: SHA256 hashes to check.
+
+        Returns:
+            The subset of file_hashes not present in the manifest.
+        """
+        batch = set(file_hashes)
+        if not batch:
+            return set()
+        rows = self.con.execute(
+            "SELECT file_hash FROM file_manifest WHERE file_hash IN (SELECT unnest(?::VARCHAR[]));",
+            [list(batch)]
+        ).fetchall()
+        return batch - {row[0] for row in rows}
 
     def register_file(self, file_hash: str, source_path: str):
         """
@@ -54,19 +103,97 @@ class ManifestManager:
         Raises:
             duckdb.ConstraintException: If the file_hash (primary key) already exists.
         """
-        current_timestamp = datetime.datetime.now() # Explicit timestamp for clarity if needed elsewhere
-        insert_sql = """
-        INSERT INTO file_manifest (file_hash, file_path, registration_timestamp, status)
-        VALUES (?, ?, ?, ?);
+        self.register_files([(file_hash, source_path)])
+
+    def register_files(self, entries: list[tuple[str, str]]):
         """
-        # Note: 'status' and 'registration_timestamp' will use DEFAULT if not provided or if NULL is inserted
-        # Depending on exact DB behavior, explicitly providing 'registered' and current_timestamp is safer.
+        Registers a batch of new files in the 'file_manifest' table with a single
+        append and commit, instead of one INSERT and commit per file.
+
+        Args:
+            entries: (file_hash, source_path) pairs to register.
+
+        Raises:
+            duckdb.ConstraintException: If any file_hash (primary key) already exists.
+                The whole batch is rejected in that case.
+        """
+        if not entries:
+            return
+        current_timestamp = datetime.datetime.now()
+        batch_df = pd.DataFrame({
+            'file_hash': [file_hash for file_hash, _ in entries],
+            'file_path': [source_path for _, source_path in entries],
+            'registration_timestamp': [current_timestamp] * len(entries),
+            'status': ['registered'] * len(entries),
+        })
         try:
-            self.con.execute(insert_sql, [file_hash, source_path, current_timestamp, 'registered'])
+            # Column order matches the file_manifest definition above
+            self.con.append('file_manifest', batch_df)
             self.con.commit() # Commit the transaction
         except duckdb.Error as e: # Catch DuckDB specific errors
             raise e # Re-raise the exception to be handled by the caller
 
+    def unregister_files(self, file_hashes: list[str]):
+        """
+        Removes files from the 'file_manifest' table, e.g. when storing their content
+        failed after they were registered.
+
+        Args:
+            file_hashes: SHA256 hashes of the files to remove. Unknown hashes are ignored.
+        """
+        if not file_hashes:
+            return
+        self.con.execute("DELETE FROM file_manifest WHERE file_hash IN (SELECT unnest(?::VARCHAR[]));", [list(file_hashes)])
+        self.con.commit()
+
+    def load_path_cache(self) -> dict[str, tuple[int, int, str]]:
+        """
+        Loads the scan cache of previously hashed paths.
+
+        Returns:
+            A dict mapping source_path -> (mtime_ns, size, file_hash), in the form
+            accepted by FileScanner.scan_directory's hash_cache argument.
+        """
+        rows = self.con.execute("SELECT source_path, mtime_ns, size, file_hash FROM path_cache;").fetchall()
+        return {source_path: (mtime_ns, size, file_hash) for source_path, mtime_ns, size, file_hash in rows}
+
+    def save_path_cache(
+        self,
+        entries: dict[str, tuple[int, int, str]],
+        scan_root: str | None = None,
+        seen_paths: set[str] | None = None
+    ):
+        """
+        Inserts or replaces scan cache entries in a single statement. When scan_root
+        is given, entries for paths under scan_root that are not in seen_paths are
+        deleted first, so files removed from the scanned tree do not stay cached.
+        Entries outside scan_root are kept.
+
+        Args:
+            entries: A dict mapping source_path -> (mtime_ns, size, file_hash).
+            scan_root: The directory the scan walked, spelled as the scanner spells
+                the paths under it.
+            seen_paths: The paths the scan found under scan_root.
+        """
+        if scan_root is not None:
+            self.con.execute(
+                "DELETE FROM path_cache WHERE starts_with(source_path, ?) "
+                "AND source_path NOT IN (SELECT unnest(?::VARCHAR[]));",
+                [os.path.join(scan_root, ''), list(seen_paths or ())]
+            )
+        if entries:
+            batch_df = pd.DataFrame(
+                [(source_path, *entry) for source_path, entry in entries.items()],
+                columns=['source_path', 'mtime_ns', 'size', 'file_hash']
+            )
+            self.con.register('path_cache_batch', batch_df)
+            try:
+                self.con.execute("INSERT OR REPLACE INTO path_cache SELECT * FROM path_cache_batch;")
+            finally:
+                self.con.unregister('path_cache_batch')
+        if scan_root is not None or entries:
+            self.con.commit()
+
     def update_status(self, file_hash: str, new_status: str):
         """
         Updates the status of an existing file in the manifest.
@@ -102,9 +229,9 @@ class ManifestManager:
 
     def close(self):
         """
-        Closes the database connection.
+        Closes the database connection, unless it was supplied by the caller.
         """
-        if self.con:
+        if self.con and self._owns_connection:
             self.con.close()
 
 if __name__ == '__main__':
@@ -1,22 +1,62 @@
+import os
 import pathlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import duckdb
 from src.sp_data_v16.core.config import load_config
 from src.sp_data_v16.ingestion.manifest import ManifestManager
 from src.sp_data_v16.ingestion.scanner import FileScanner
 from .raw_loader import RawLakeLoader
 
+# Number of new files registered in the manifest per append
+REGISTER_BATCH_SIZE = 1024
+# Raw Lake writes are flushed every RAW_LAKE_BATCH_SIZE files or RAW_LAKE_BATCH_BYTES
+# bytes of content, whichever comes first, to bound the memory held per batch
+RAW_LAKE_BATCH_SIZE = 256
+RAW_LAKE_BATCH_BYTES = 64 * 1024 * 1024
+# New files are read on a thread pool while the main thread writes to DuckDB;
+# at most READ_AHEAD_FILES reads, totalling at most READ_AHEAD_BYTES of file size,
+# are in flight to cap the memory held (a single larger file is still read alone).
+READ_WORKERS = min(8, os.cpu_count() or 1)
+READ_AHEAD_FILES = 64
+READ_AHEAD_BYTES = RAW_LAKE_BATCH_BYTES
+
 class IngestionPipeline:
     """
     Controls the overall file ingestion process, integrating scanning, manifest checking,
     and registration of new files.
     """
-    def __init__(self, config_path: str = "config_v16.yaml"):
+    def __init__(
+        self,
+        config_path: str = "config_v16.yaml",
+        config: dict | None = None,
+        shared_con: duckdb.DuckDBPyConnection | None = None,
+        shared_raw_lake_con: duckdb.DuckDBPyConnection | None = None,
+        *,
+        manifest_manager: ManifestManager | None = None,
+        raw_lake_loader: RawLakeLoader | None = None,
+        file_scanner: FileScanner | None = None
+    ):
         """
         Initializes the IngestionPipeline.
 
         Args:
             config_path: Path to the configuration file (e.g., "config_v16.yaml").
+                Ignored when config is given.
+            config: An already loaded configuration dictionary. When provided, no
+                configuration file is read.
+            shared_con: An open connection to the manifest DB, reused instead of opening
+                the file again. The pipeline does not close it.
+            shared_raw_lake_con: Same as shared_con, for the Raw Lake DB.
+            manifest_manager: A ready ManifestManager to use instead of opening
+                manifest_db_path. shared_con is ignored when this is given. The
+                pipeline does not close it.
+            raw_lake_loader: A ready RawLakeLoader to use instead of opening
+                raw_lake_db_path. shared_raw_lake_con is ignored when this is given.
+                The pipeline does not close it.
+            file_scanner: The scanner providing scan_directory(). Defaults to FileScanner.
         """
-        self.config = load_config(config_path)
+        self.config = config if config is not None else load_config(config_path)
 
         # Ensure necessary config keys exist
         if not self.config:
@@ -32,24 +72,60 @@ class IngestionPipeline:
         self.raw_lake_db_path = self.config["database"]["raw_lake_db_path"]
         self.input_directory = self.config["paths"]["input_directory"]
 
-        # Ensure the directory for the manifest DB exists
-        db_parent_dir = pathlib.Path(self.manifest_db_path).parent
-        db_parent_dir.mkdir(parents=True, exist_ok=True)
+        # Only components created here are closed at the end of run()
+        self._owns_manifest_manager = manifest_manager is None
+        self._owns_raw_loader = raw_lake_loader is None
+
+        if manifest_manager is not None:
+            self.manifest_manager = manifest_manager
+        else:
+            # Ensure the directory for the manifest DB exists
+            pathlib.Path(self.manifest_db_path).parent.mkdir(parents=True, exist_ok=True)
+            if shared_con is not None:
+                self.manifest_manager = ManifestManager(db_path=self.manifest_db_path, con=shared_con)
+            else:
+                self.manifest_manager = ManifestManager(db_path=self.manifest_db_path)
 
-        # Ensure the directory for the raw lake DB exists
-        raw_lake_db_parent_dir = pathlib.Path(self.raw_lake_db_path).parent
-        raw_lake_db_parent_dir.mkdir(parents=True, exist_ok=True)
+        if raw_lake_loader is not None:
+            self.raw_loader = raw_lake_loader
+        else:
+            # Ensure the directory for the raw lake DB exists
+            pathlib.Path(self.raw_lake_db_path).parent.mkdir(parents=True, exist_ok=True)
+            if shared_raw_lake_con is not None:
+                self.raw_loader = RawLakeLoader(db_path=self.raw_lake_db_path, con=shared_raw_lake_con)
+            else:
+                self.raw_loader = RawLakeLoader(db_path=self.raw_lake_db_path)
 
-        self.manifest_manager = ManifestManager(db_path=self.manifest_db_path)
-        self.raw_loader = RawLakeLoader(db_path=self.raw_lake_db_path)
+        self.file_scanner = file_scanner if file_scanner is not None else FileScanner
         print(f"IngestionPipeline initialized. Manifest DB: '{self.manifest_db_path}', Raw Lake DB: '{self.raw_lake_db_path}', Input Dir: '{self.input_directory}'")
 
+    @classmethod
+    def from_config(
+        cls,
+        config: dict,
+        shared_con: duckdb.DuckDBPyConnection | None = None,
+        shared_raw_lake_con: duckdb.DuckDBPyConnection | None = None
+    ) -> "IngestionPipeline":
+        """
+        Creates an IngestionPipeline from a configuration dictionary instead of a file.
+
+        Args:
+            config: The configuration dictionary, with the same layout as config_v16.yaml.
+            shared_con: Optional open manifest DB connection to reuse (see __init__).
+            shared_raw_lake_con: Optional open Raw Lake DB connection to reuse (see __init__).
+
+        Returns:
+            A new IngestionPipeline instance.
+        """
+        return cls(config=config, shared_con=shared_con, shared_raw_lake_con=shared_raw_lake_con)
+
     def run(self):
         """
         Executes the full ingestion pipeline:
-        1. Scans the input directory for files.
-        2. For each file, checks if it's already registered in the manifest.
-        3. If new, registers the file. If existing, skips it.
+        1. Scans and hashes every file in the input directory.
+        2. Checks all scanned hashes against the manifest in a single query.
+        3. Registers new files in batches and loads them into the Raw Lake.
+           Files already in the manifest are skipped.
         4. Prints a summary report.
         """
         print(f"Starting ingestion process for directory: {self.input_directory}...")
@@ -58,19 +134,38 @@ class IngestionPipeline:
         skipped_count = 0
 
         try:
-            for file_hash, file_path in FileScanner.scan_directory(self.input_directory):
+            # Files whose mtime and size match the cache are not re-hashed
+            path_cache = self.manifest_manager.load_path_cache()
+            previous_path_cache = dict(path_cache)
+            scanned_files = {} # file_hash -> first path seen with that content
+            seen_paths = set() # Every path found by this scan, to prune cache entries of removed files
+            for file_hash, file_path in self.file_scanner.scan_directory(self.input_directory, hash_cache=path_cache):
                 scanned_count += 1
-                file_name = file_path.name
-
-                if self.manifest_manager.hash_exists(file_hash):
-                    print(f"檔案已存在：{file_name} (Hash: {file_hash[:8]}...), 跳過處理。")
+                seen_paths.add(str(file_path))
+                if file_hash in scanned_files:
+                    print(f"檔案已存在：{file_path.name} (Hash: {file_hash[:8]}...), 跳過處理。")
                     skipped_count += 1
                 else:
-                    self.manifest_manager.register_file(file_hash, str(file_path))
-                    self.raw_loader.save_file(file_path, file_hash)
-                    self.manifest_manager.update_status(file_hash, 'loaded_to_raw_lake')
-                    print(f"新檔案發現：{file_name} (Hash: {file_hash[:8]}...), 已登錄 Manifest 並存入 Raw Lake。")
-                    added_count += 1
+                    scanned_files[file_hash] = file_path
+
+            # One manifest lookup for the whole scan instead of one per file
+            new_hashes = self.manifest_manager.filter_new_hashes(list(scanned_files))
+            new_files = []
+            for file_hash, file_path in scanned_files.items():
+                if file_hash in new_hashes:
+                    new_files.append((file_hash, file_path))
+                else:
+                    print(f"檔案已存在：{file_path.name} (Hash: {file_hash[:8]}...), 跳過處理。")
+                    skipped_count += 1
+
+            for start in range(0, len(new_files), REGISTER_BATCH_SIZE):
+                added_count += self._load_new_files(new_files[start:start + REGISTER_BATCH_SIZE])
+
+            self.manifest_manager.save_path_cache(
+                {path: entry for path, entry in path_cache.items() if previous_path_cache.get(path) != entry},
+                scan_root=str(pathlib.Path(self.input_directory)), # The scanner's spelling of the root
+                seen_paths=seen_paths
+            )
         except FileNotFoundError as e:
             print(f"Error during scanning: {e}")
             print("Ingestion process aborted.")
@@ -80,13 +175,101 @@ class IngestionPipeline:
             print("Ingestion process aborted.")
             return
         finally:
-            self.manifest_manager.close() # Ensure DB connection is closed
-            if hasattr(self, 'raw_loader') and self.raw_loader:
+            if self._owns_manifest_manager:
+                self.manifest_manager.close() # Ensure DB connection is closed
+            if self._owns_raw_loader:
                 self.raw_loader.close()
 
         print("\n--- Ingestion Summary ---")
         print(f"流程結束。共掃描 {scanned_count} 個檔案，新增 {added_count} 個，跳過 {skipped_count} 個。")
 
+    def _load_new_files(self, new_files: list) -> int:
+        """
+        Reads a batch of new files and stores them in size-bounded batches; each batch
+        is registered in the manifest, written to the Raw Lake and marked as loaded.
+
+        Args:
+            new_files: (file_hash, file_path) pairs not yet in the manifest.
+
+        Returns:
+            The number of files loaded.
+        """
+        if not new_files:
+            return 0
+
+        pending = [] # (file_hash, file_path, raw_content) awaiting a Raw Lake flush
+        pending_bytes = 0
+        for file_hash, file_path, raw_content in self._read_file_contents(new_files):
+            pending.append((file_hash, file_path, raw_content))
+            pending_bytes += len(raw_content)
+            if len(pending) >= RAW_LAKE_BATCH_SIZE or pending_bytes >= RAW_LAKE_BATCH_BYTES:
+                self._flush_raw_batch(pending)
+                pending = []
+                pending_bytes = 0
+        self._flush_raw_batch(pending)
+        return len(new_files)
+
+    @staticmethod
+    def _read_file_contents(new_files: list):
+        """
+        Reads file contents on a thread pool (file reads release the GIL) and yields
+        them in input order, so reading overlaps with the single-threaded DuckDB writes.
+
+        Args:
+            new_files: (file_hash, file_path) pairs to read.
+
+        Yields:
+            (file_hash, file_path, raw_content) tuples in the order of new_files.
+        """
+        executor = ThreadPoolExecutor(max_workers=READ_WORKERS)
+        try:
+            in_flight = deque() # (file_hash, file_path, file_size, future)
+            in_flight_bytes = 0
+            for file_hash, file_path in new_files:
+                try:
+                    file_size = file_path.stat().st_size
+                except OSError:
+                    file_size = 0 # read_bytes raises the actual error below
+                # Wait for the oldest reads until this one fits in the count and byte budgets
+                while in_flight and (
+                    len(in_flight) >= READ_AHEAD_FILES or in_flight_bytes + file_size > READ_AHEAD_BYTES
+                ):
+                    done_hash, done_path, done_size, future = in_flight.popleft()
+                    in_flight_bytes -= done_size
+                    yield done_hash, done_path, future.result()
+                in_flight.append((file_hash, file_path, file_size, executor.submit(file_path.read_bytes)))
+                in_flight_bytes += file_size
+            while in_flight:
+                file_hash, file_path, _, future = in_flight.popleft()
+                yield file_hash, file_path, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _flush_raw_batch(self, pending: list):
+        """
+        Registers buffered files in the manifest, writes their contents to the Raw Lake
+        in one batch, then updates their manifest status.
+
+        Only files whose content is about to be stored are registered, and the
+        registration is withdrawn if the Raw Lake write fails, so a failed run leaves
+        no file registered without content; the next run sees them as new again.
+
+        Args:
+            pending: (file_hash, file_path, raw_content) tuples to store.
+        """
+        if not pending:
+            return
+        batch_hashes = [file_hash for file_hash, _, _ in pending]
+        self.manifest_manager.register_files([(file_hash, str(file_path)) for file_hash, file_path, _ in pending])
+        try:
+            self.raw_loader.save_files_batch([(file_hash, raw_content) for file_hash, _, raw_content in pending])
+        except Exception:
+            self.manifest_manager.unregister_files(batch_hashes)
+            raise
+        for file_hash, file_path, _ in pending:
+            self.manifest_manager.update_status(file_hash, 'loaded_to_raw_lake')
+            print(f"新檔案發現：{file_path.name} (Hash: {file_hash[:8]}...), 已登錄 Manifest 並存入 Raw Lake。")
+
 if __name__ == '__main__':
     # This is an example of how to run the pipeline.
     # For actual execution, it's better to use the run_ingestion.py script.
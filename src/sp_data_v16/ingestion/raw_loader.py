@@ -1,11 +1,19 @@
+import mmap
+import os
 import pathlib
 import duckdb
+import pyarrow as pa
+
+# Single-row insert used by save_file
+INSERT_RAW_FILE_SQL = "INSERT INTO raw_files VALUES (?, ?)"
 
 class RawLakeLoader:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, con: duckdb.DuckDBPyConnection | None = None):
         self.db_path = pathlib.Path(db_path)
+        # A caller-supplied connection is reused and left open by close()
+        self._owns_connection = con is None
         try:
-            self.con = duckdb.connect(database=str(self.db_path))
+            self.con = con if con is not None else duckdb.connect(database=str(self.db_path))
             self._initialize_schema()
         except Exception as e:
             print(f"Error initializing database: {e}")
@@ -22,12 +30,52 @@ class RawLakeLoader:
         )
 
     def save_file(self, file_path: pathlib.Path, file_hash: str):
-        raw_data = file_path.read_bytes()
-        self.con.execute(
-            "INSERT INTO raw_files VALUES (?, ?)", (file_hash, raw_data)
-        )
+        """
+        Stores one file's content. The file is memory-mapped and handed to DuckDB as a
+        memoryview, so no Python bytes copy of the whole file is made.
+
+        Args:
+            file_path: The file to store.
+            file_hash: The SHA256 hash of the file.
+        """
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._insert_raw_content(file_hash, b"") # Empty files cannot be mapped
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    self._insert_raw_content(file_hash, view)
+                finally:
+                    view.release() # The map cannot close while a view is exported
+
+    def _insert_raw_content(self, file_hash: str, raw_content):
+        self.con.execute(INSERT_RAW_FILE_SQL, (file_hash, raw_content))
         self.con.commit()
 
+    def save_files_batch(self, entries: list[tuple[str, bytes]]):
+        """
+        Stores a batch of raw file contents with a single INSERT and commit.
+
+        The batch is handed to DuckDB as a columnar Arrow table (string hashes,
+        binary contents), which it scans directly instead of binding row by row.
+
+        Args:
+            entries: (file_hash, raw_content) pairs to store.
+        """
+        if not entries:
+            return
+        batch = pa.table({
+            'file_hash': pa.array([file_hash for file_hash, _ in entries], type=pa.string()),
+            'raw_content': pa.array([raw_content for _, raw_content in entries], type=pa.binary()),
+        })
+        self.con.register('raw_files_batch', batch)
+        try:
+            self.con.execute("INSERT INTO raw_files SELECT file_hash, raw_content FROM raw_files_batch")
+            self.con.commit()
+        finally:
+            self.con.unregister('raw_files_batch')
+
     def close(self):
-        if hasattr(self, "con") and self.con:
+        if hasattr(self, "con") and self.con and self._owns_connection:
             self.con.close()
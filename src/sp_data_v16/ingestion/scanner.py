@@ -1,21 +1,158 @@
 import hashlib
+import os
 import pathlib
-from typing import Iterator, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 
+# Batches of at least this many files are hashed on a thread pool: file reads and
+# sha256 updates release the GIL, and threads cost almost nothing to start. A
+# process pool is deliberately not used, since forking after DuckDB connections,
+# tqdm and other threads are live in the parent can deadlock the children.
+THREAD_HASH_MIN_FILES = 5
+
+# Not available on macOS or Windows
+_posix_fadvise = getattr(os, "posix_fadvise", None)
+
+# Size of the read buffer reused for every file hashed by a thread
+HASH_BUFFER_SIZE = 1 << 20
+_EMPTY_SHA256 = hashlib.sha256()
+_hash_buffers = threading.local()
+
+
+def _get_hash_buffer() -> memoryview:
+    """
+    Returns this thread's hash read buffer, allocating it on first use, so hashing
+    many files does not allocate a new buffer per file.
+    """
+    buffer = getattr(_hash_buffers, "view", None)
+    if buffer is None:
+        buffer = _hash_buffers.view = memoryview(bytearray(HASH_BUFFER_SIZE))
+    return buffer
+
+
+def _walk_files(root: str) -> List[str]:
+    """
+    Recursively lists the files under a directory with os.scandir, whose entries
+    carry the file type from the directory read itself, so no per-entry stat call
+    or Path object is needed. Like Path.rglob, symlinked directories are not followed
+    and directories that cannot be listed are skipped.
+
+    Args:
+        root: The directory to walk.
+
+    Returns:
+        The paths (as strings) of all regular files under root.
+    """
+    files = []
+    stack = [root]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            entries = os.scandir(current_dir)
+        except PermissionError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry.path)
+    return files
+
+
+def _hash_file(file_path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Calculates the SHA256 hash of a single file.
+
+    Args:
+        file_path: The file to hash.
+
+    Returns:
+        A tuple of (file_path, hex digest, None) on success, or
+        (file_path, None, warning message) if the file could not be hashed.
+    """
+    try:
+        with open(file_path, 'rb', buffering=0) as f:
+            if _posix_fadvise is not None:
+                # Whole-file sequential read: let the kernel use a larger readahead
+                # window. The pages are kept cached because new files are read
+                # again right after the scan to be stored in the Raw Lake.
+                _posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # Read straight into the reused buffer; copying the empty-state hasher
+            # skips re-running the constructor's name lookup
+            hasher = _EMPTY_SHA256.copy()
+            buffer = _get_hash_buffer()
+            while size := f.readinto(buffer):
+                hasher.update(buffer[:size])
+            return file_path, hasher.hexdigest(), None
+    except IOError as e:
+        return file_path, None, f"Warning: Could not read or hash file {file_path}: {e}"
+    except Exception as e:
+        return file_path, None, f"Warning: An unexpected error occurred while processing file {file_path}: {e}"
+
+
+def _split_cached(file_paths: List[str], hash_cache: Dict[str, Tuple[int, int, str]]):
+    """
+    Separates files whose (mtime_ns, size) still match their hash_cache entry from
+    files that have to be hashed.
+
+    Args:
+        file_paths: The files found by the walk.
+        hash_cache: Mapping of path -> (mtime_ns, size, file_hash) from a previous scan.
+
+    Returns:
+        A tuple (cached, to_hash, signatures): cached maps path -> file_hash for
+        unchanged files, to_hash lists the paths to hash, and signatures maps each
+        of those paths to its current (mtime_ns, size).
+    """
+    cached = {}
+    to_hash = []
+    signatures = {}
+    for file_path in file_paths:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            to_hash.append(file_path) # Let _hash_file report the problem
+            continue
+        signature = (st.st_mtime_ns, st.st_size)
+        entry = hash_cache.get(file_path)
+        if entry is not None and tuple(entry[:2]) == signature:
+            cached[file_path] = entry[2]
+        else:
+            to_hash.append(file_path)
+            signatures[file_path] = signature
+    return cached, to_hash, signatures
+
+
 class FileScanner:
     """
     A utility class for scanning directories and calculating file hashes.
     """
 
     @staticmethod
-    def scan_directory(directory_path: str) -> Iterator[Tuple[str, pathlib.Path]]:
+    def scan_directory(
+        directory_path: str,
+        max_workers: Optional[int] = None,
+        hash_cache: Optional[Dict[str, Tuple[int, int, str]]] = None
+    ) -> Iterator[Tuple[str, pathlib.Path]]:
         """
         Scans a directory recursively for files, calculates their SHA256 hash,
         and yields the hash along with the file path.
 
+        Batches of THREAD_HASH_MIN_FILES files or more are hashed on a thread pool;
+        results are still yielded in scan order.
+
         Args:
             directory_path: The path to the directory to scan.
+            max_workers: Number of threads for parallel hashing.
+                Defaults to the executor's own default.
+            hash_cache: Optional mapping of path -> (mtime_ns, size, file_hash) from a
+                previous scan. Files whose modification time and size are unchanged
+                reuse the cached hash instead of being read; entries for files that
+                are hashed are added or updated in place. Cached files are yielded
+                before hashed ones.
 
         Yields:
             A tuple containing the SHA256 hash (hex string) and the pathlib.Path object for each file.
@@ -31,28 +168,38 @@ class FileScanner:
             raise FileNotFoundError(f"Path is not a directory: {directory_path}")
 
         # First, collect all files to be processed to have an accurate total for tqdm
-        all_files = [f for f in path_obj.rglob('*') if f.is_file()]
-
-        # Use tqdm for progress bar
-        for file_path in tqdm(all_files, desc=f"Scanning {directory_path}", unit="file"):
-            try:
-                hasher = hashlib.sha256()
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(4096)  # Read in 4KB chunks
-                        if not chunk:
-                            break
-                        hasher.update(chunk)
-                file_hash = hasher.hexdigest()
-                yield file_hash, file_path
-            except IOError as e:
-                # Optionally, log this error or handle it more gracefully
-                # For now, we'll print a warning and skip the file.
-                print(f"Warning: Could not read or hash file {file_path}: {e}")
-                continue
-            except Exception as e:
-                print(f"Warning: An unexpected error occurred while processing file {file_path}: {e}")
-                continue
+        all_files = _walk_files(str(path_obj))
+
+        if hash_cache is not None:
+            cached, to_hash, signatures = _split_cached(all_files, hash_cache)
+        else:
+            cached, to_hash, signatures = {}, all_files, {}
+
+        executor = None
+        if len(to_hash) >= THREAD_HASH_MIN_FILES:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            results = executor.map(_hash_file, to_hash)
+        else:
+            results = map(_hash_file, to_hash)
+
+        try:
+            # Use tqdm for progress bar
+            with tqdm(total=len(all_files), desc=f"Scanning {directory_path}", unit="file") as progress:
+                for file_path, file_hash in cached.items():
+                    progress.update()
+                    yield file_hash, pathlib.Path(file_path)
+                for file_path, file_hash, error in results:
+                    progress.update()
+                    if error:
+                        # For now, we'll print a warning and skip the file.
+                        print(error)
+                        continue
+                    if file_path in signatures:
+                        hash_cache[file_path] = (*signatures[file_path], file_hash)
+                    yield file_hash, pathlib.Path(file_path)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
 
 if __name__ == '__main__':
     # Example Usage (for direct testing of this script)
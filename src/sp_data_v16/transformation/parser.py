@@ -1,5 +1,70 @@
+import codecs
+import functools
 import pandas as pd
 import io
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Leading bytes decoded before parsing to reject content in the wrong encoding early
+ENCODING_SAMPLE_SIZE = 4096
+
+@functools.lru_cache(maxsize=128)
+def _schema_read_csv_kwargs(column_names: tuple, encoding: str, delimiter: str) -> dict:
+    """
+    Builds the pd.read_csv keyword arguments for a schema once; the same few schemas
+    drive every parse call of a transformation run.
+
+    Args:
+        column_names (tuple): Column names, in file order.
+        encoding (str): The encoding of the raw content.
+        delimiter (str): The field delimiter.
+
+    Returns:
+        dict: Keyword arguments for pd.read_csv. Shared across calls; use
+            _read_csv_kwargs for a copy that is safe to hand out.
+    """
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'names': list(column_names), # Use the extracted/validated list of names
+        'header': None,  # We are providing column names via 'names'
+        'skipinitialspace': True, # Handles spaces after delimiter
+        'index_col': False # Explicitly prevent first column from becoming index
+    }
+
+def _read_csv_kwargs(column_names: tuple, encoding: str, delimiter: str) -> dict:
+    """
+    Returns the cached pd.read_csv keyword arguments for a schema as a fresh dict
+    with its own names list, so no call can alter another call's options.
+
+    Args:
+        column_names (tuple): Column names, in file order.
+        encoding (str): The encoding of the raw content.
+        delimiter (str): The field delimiter.
+
+    Returns:
+        dict: Keyword arguments for pd.read_csv.
+    """
+    cached = _schema_read_csv_kwargs(column_names, encoding, delimiter)
+    return dict(cached, names=list(cached['names']))
+
+@functools.lru_cache(maxsize=128)
+def _arrow_csv_options(column_names: tuple, encoding: str, delimiter: str) -> tuple:
+    """
+    Builds the pyarrow.csv read and parse options for a schema once.
+
+    Args:
+        column_names (tuple): Column names, in file order.
+        encoding (str): The encoding of the raw content.
+        delimiter (str): The field delimiter.
+
+    Returns:
+        tuple: (ReadOptions, ParseOptions) for pyarrow.csv.read_csv.
+    """
+    return (
+        pa_csv.ReadOptions(column_names=list(column_names), encoding=encoding),
+        pa_csv.ParseOptions(delimiter=delimiter)
+    )
 
 class DataParser:
     """
@@ -16,6 +81,10 @@ class DataParser:
             schema (dict): A dictionary defining parsing parameters like
                            'encoding', 'delimiter', and 'columns'.
                            Example: {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['col1', 'col2']}
+                           Setting 'csv_engine' to 'pyarrow' reads the content with Arrow's
+                           multithreaded CSV reader instead of pandas. Unlike the pandas path
+                           it does not strip spaces after the delimiter; content Arrow cannot
+                           read (e.g. rows with a different number of fields) falls back to pandas.
 
         Returns:
             pd.DataFrame | None: A pandas DataFrame if parsing is successful, otherwise None.
@@ -43,21 +112,20 @@ class DataParser:
             return None
 
         try:
-            # Decode the byte string to a text string
-            decoded_content = raw_content.decode(encoding)
-
-            # Use StringIO to treat the string as a file
-            content_io = io.StringIO(decoded_content)
-
-            # Read into pandas DataFrame
-            df = pd.read_csv(
-                content_io,
-                delimiter=delimiter,
-                names=column_names, # Use the extracted/validated list of names
-                header=None,  # We are providing column names via 'names'
-                skipinitialspace=True, # Handles spaces after delimiter
-                index_col=False # Explicitly prevent first column from becoming index
-            )
+            # A decode error in the first few KiB fails the whole file, so check the
+            # sample before handing a possibly multi-MB payload to the CSV reader.
+            # final=False lets a multibyte character cut at the sample edge pass.
+            codecs.getincrementaldecoder(encoding)().decode(raw_content[:ENCODING_SAMPLE_SIZE], final=False)
+
+            column_key = tuple(column_names) # Hashable key for the cached reader options
+            df = None
+            if schema.get('csv_engine') == 'pyarrow':
+                df = self._read_with_arrow(raw_content, encoding, delimiter, column_key)
+
+            if df is None:
+                # Hand pandas the bytes and the encoding: the C parser decodes them
+                # chunk by chunk, so no decoded copy of the whole content is built
+                df = pd.read_csv(io.BytesIO(raw_content), **_read_csv_kwargs(column_key, encoding, delimiter))
             # Handle potential skipping of rows (e.g., for keywords or headers in the data file itself)
             # This should ideally be driven by the schema.
             rows_to_skip = schema.get('csv_skip_rows', 0)
@@ -86,6 +154,31 @@ class DataParser:
             print(f"Error: An unexpected error occurred during parsing: {e}")
             return None
 
+    @staticmethod
+    def _read_with_arrow(raw_content: bytes, encoding: str, delimiter: str, column_names: tuple) -> pd.DataFrame | None:
+        """
+        Reads CSV content with pyarrow.csv, transcoding non-UTF-8 input on the fly.
+
+        Args:
+            raw_content (bytes): The raw byte string to parse.
+            encoding (str): The encoding of raw_content.
+            delimiter (str): The field delimiter.
+            column_names (tuple): Names for the columns, in file order.
+
+        Returns:
+            pd.DataFrame | None: The parsed DataFrame, or None if Arrow could not read the
+            content, in which case the caller falls back to pandas.
+        """
+        try:
+            read_options, parse_options = _arrow_csv_options(column_names, encoding, delimiter)
+            table = pa_csv.read_csv(pa.BufferReader(raw_content), read_options=read_options, parse_options=parse_options)
+        except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+            print(f"Warning: pyarrow could not read the CSV content, falling back to pandas: {e}")
+            return None
+        # Each column becomes its own block and Arrow buffers are released as they are
+        # converted, so the table and the DataFrame are never both fully in memory
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
 if __name__ == '__main__':
     parser = DataParser()
 
@@ -2,6 +2,7 @@ import logging
 import duckdb
 import pathlib
 import pandas as pd
+import pyarrow as pa
 from .schema_manager import SchemaManager
 from .raw_lake_reader import RawLakeReader
 from .parser import DataParser
@@ -10,9 +11,24 @@ from .processed_loader import ProcessedDBLoader
 from src.sp_data_v16.ingestion.manifest import ManifestManager # Assuming ManifestManager handles its own connection
 from src.sp_data_v16.core.config import load_config
 
+PENDING_FILES_COLUMNS = ["file_hash", "file_path", "status", "registration_timestamp"]
+PENDING_FILES_QUERY = (
+    f"SELECT {', '.join(PENDING_FILES_COLUMNS)} FROM file_manifest WHERE status = 'loaded_to_raw_lake' "
+    "ORDER BY file_hash"
+)
+
 class TransformationPipeline:
-    def __init__(self, config_path: str = "config_v16.yaml"):
-        self.config = load_config(config_path)
+    def __init__(self, config_path: str = "config_v16.yaml", config: dict | None = None):
+        """
+        Initializes the TransformationPipeline.
+
+        Args:
+            config_path: Path to the configuration file (e.g., "config_v16.yaml").
+                Ignored when config is given.
+            config: An already loaded configuration dictionary. When provided, no
+                configuration file is read.
+        """
+        self.config = config if config is not None else load_config(config_path)
 
         db_config = self.config.get("database", {})
         paths_config = self.config.get("paths", {})
@@ -68,10 +84,9 @@ class TransformationPipeline:
             raise  # Re-raising for now
 
         try:
-            # ManifestManager will create its own connection.
-            # It's designed to be independent or take an existing connection.
-            # For this integration, let it manage its own based on path.
-            self.manifest_manager = ManifestManager(db_path=str(self.manifest_db_path))
+            # ManifestManager reuses manifest_con instead of opening the same file a second
+            # time; it does not close a connection it was given, close() below does.
+            self.manifest_manager = ManifestManager(db_path=str(self.manifest_db_path), con=self.manifest_con)
         except ConnectionError as e: # Assuming ManifestManager might raise ConnectionError
             print(f"Error initializing ManifestManager: {e}")
             raise # Re-raising for now
@@ -85,31 +100,51 @@ class TransformationPipeline:
 
         print(f"TransformationPipeline initialized. Manifest: {self.manifest_db_path}, RawLake (via Reader): {self.raw_lake_db_path}, ProcessedDB: {self.processed_db_path}, Schemas: {self.schema_config_path}")
 
+    @classmethod
+    def from_config(cls, config: dict) -> "TransformationPipeline":
+        """
+        Creates a TransformationPipeline from a configuration dictionary instead of a file.
+
+        Args:
+            config: The configuration dictionary, with the same layout as config_v16.yaml.
+
+        Returns:
+            A new TransformationPipeline instance.
+        """
+        return cls(config=config)
+
     def find_pending_files(self) -> list[dict]:
         """
         Queries the manifest.db for all records with the status 'loaded_to_raw_lake'.
 
         Returns:
             list[dict]: A list of dictionaries, where each dictionary represents a record.
-                        Keys are column names.
+                        Keys are column names. Records are ordered by file_hash.
         """
         try:
-            cursor = self.manifest_con.execute(
-                "SELECT file_hash, file_path, status, registration_timestamp FROM file_manifest WHERE status = 'loaded_to_raw_lake'"
-            )
-            results = cursor.fetchall()
-            if not results:
-                return []
-
-            # Get column names from cursor description
-            column_names = [desc[0] for desc in cursor.description]
-
-            # Convert list of tuples to list of dictionaries
-            return [dict(zip(column_names, row)) for row in results]
+            cursor = self.manifest_con.execute(PENDING_FILES_QUERY)
+            # Fetch the result as Arrow columns and build the dicts in one call instead of
+            # going through per-row tuples. pa.table() accepts both what .arrow() returns
+            # on older DuckDB (a Table) and on newer ones (a RecordBatchReader).
+            return pa.table(cursor.arrow()).to_pylist()
         except duckdb.Error as e:
             print(f"Database error in find_pending_files: {e}")
             return []
 
+    def find_pending_files_df(self) -> pd.DataFrame:
+        """
+        Columnar variant of find_pending_files, for callers that work on whole columns.
+
+        Returns:
+            pd.DataFrame: One row per record with status 'loaded_to_raw_lake', ordered by
+                          file_hash. Empty (with the same columns) on a database error.
+        """
+        try:
+            return self.manifest_con.execute(PENDING_FILES_QUERY).df()
+        except duckdb.Error as e:
+            print(f"Database error in find_pending_files_df: {e}")
+            return pd.DataFrame(columns=PENDING_FILES_COLUMNS)
+
     def run(self):
         logging.info("Transformation pipeline run method started.")
         try:
@@ -1,54 +1,110 @@
+import numpy as np
 import pandas as pd
 
+# Maximum number of offending rows quoted in a single warning message
+MAX_ERROR_PREVIEW = 10
+
 class DataValidator:
-    def validate(self, dataframe: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    def validate(self, dataframe: pd.DataFrame, schema: dict, fail_fast: bool = False) -> pd.DataFrame:
         """
         Validates the DataFrame based on the provided schema.
 
         Args:
             dataframe: The pandas DataFrame to validate.
             schema: A dictionary defining the schema with 'columns' information.
+                    'datetime'/'date' columns may carry an optional 'format' hint
+                    (e.g. '%Y-%m-%d') to avoid per-element format inference.
+            fail_fast: If True, raise on the first critical error instead of checking
+                       the remaining columns and returning None.
 
         Returns:
             A pandas DataFrame with data types converted and nullability checked.
+
+        Raises:
+            ValueError: If fail_fast is True and a non-nullable column contains NaN values,
+                or an enum column contains values outside its allowed set.
         """
         processed_df = dataframe.copy()
         warnings = []
         has_critical_error = False # Flag for critical validation errors
+        columns_schema = schema.get('columns', {})
 
-        for column_name, col_schema in schema.get('columns', {}).items():
+        for column_name, col_schema in columns_schema.items():
             if column_name not in processed_df.columns:
                 warnings.append(f"Warning: Column '{column_name}' defined in schema but not found in DataFrame.")
                 continue
 
             target_dtype = col_schema.get('dtype')
             nullable = col_schema.get('nullable', True)
+            original = dataframe[column_name]
 
             if target_dtype == 'integer':
-                processed_df[column_name] = pd.to_numeric(processed_df[column_name], errors='coerce').astype('Int64') # Use Int64 to support NaN
+                converted = pd.to_numeric(processed_df[column_name], errors='coerce')
+                has_nan = converted.isna().any()
+                if not nullable and not has_nan and self._is_int64_safe(converted):
+                    # A non-nullable column can never hold NaN, so plain numpy int64 is enough
+                    processed_df[column_name] = converted.astype('int64', copy=False)
+                elif nullable or not has_nan:
+                    processed_df[column_name] = converted.astype('Int64') # Use Int64 to support NaN
+                else:
+                    # Non-nullable column with NaN: this is a critical error and the frame is
+                    # discarded, so keep the float64 values for the diagnostics below.
+                    processed_df[column_name] = converted
             elif target_dtype == 'float':
                 processed_df[column_name] = pd.to_numeric(processed_df[column_name], errors='coerce')
-            elif target_dtype == 'datetime':
-                processed_df[column_name] = pd.to_datetime(processed_df[column_name], errors='coerce')
+            elif target_dtype in ('datetime', 'date'):
+                # An explicit 'format' hint lets pandas skip per-element format inference
+                datetime_format = col_schema.get('format')
+                converted = pd.to_datetime(
+                    processed_df[column_name],
+                    format=datetime_format,
+                    exact=not datetime_format,
+                    errors='coerce',
+                    cache=True
+                )
+                if target_dtype == 'date':
+                    converted = converted.dt.normalize() # Drop the time-of-day component
+                processed_df[column_name] = converted
+            elif target_dtype == 'enum' and col_schema.get('enum'):
+                try:
+                    self._validate_enum_series(processed_df[column_name], frozenset(col_schema['enum']))
+                except ValueError as e:
+                    if fail_fast:
+                        raise ValueError(f"Column '{column_name}': {e}") from e
+                    warnings.append(f"Critical: Column '{column_name}': {e}")
+                    has_critical_error = True
             # Add other type conversions here if needed, e.g., string, boolean
 
             # Check for NaN values after conversion
-            if target_dtype in ['integer', 'float', 'datetime']:
-                conversion_errors = processed_df[column_name].isna() & ~dataframe[column_name].isna()
-                if conversion_errors.any():
-                    error_indices = conversion_errors[conversion_errors].index.tolist()
-                    original_values = dataframe[column_name][error_indices].tolist()
+            if target_dtype in ['integer', 'float', 'datetime', 'date']:
+                # Only converted columns need the original NaN mask; string and enum
+                # columns skip the isna() pass over their object data
+                orig_na = original.isna().to_numpy()
+                conversion_errors = processed_df[column_name].isna().to_numpy() & ~orig_na
+                bad_positions = np.flatnonzero(conversion_errors)
+                if bad_positions.size:
+                    head = bad_positions[:MAX_ERROR_PREVIEW]
+                    error_indices = processed_df.index[head].tolist()
+                    original_values = original.to_numpy()[head].tolist()
                     warnings.append(
                         f"Warning: Column '{column_name}' (dtype: {target_dtype}) had values that could not be converted. "
-                        f"Indices: {error_indices}. Original values: {original_values}. These were set to NaN."
+                        f"First {len(head)} of {bad_positions.size} bad: Indices: {error_indices}. "
+                        f"Original values: {original_values}. These were set to NaN."
                     )
 
             # Nullability check
             if not nullable:
-                if processed_df[column_name].isna().any():
-                    nan_indices = processed_df[column_name][processed_df[column_name].isna()].index.tolist()
+                nan_positions = np.flatnonzero(processed_df[column_name].isna().to_numpy())
+                if nan_positions.size:
+                    nan_indices = processed_df.index[nan_positions[:MAX_ERROR_PREVIEW]].tolist()
+                    if fail_fast:
+                        raise ValueError(
+                            f"Column '{column_name}' is defined as non-nullable but contains NaN values "
+                            f"({nan_positions.size} in total) at indices: {nan_indices}."
+                        )
                     warnings.append(
-                        f"Critical: Column '{column_name}' is defined as non-nullable but contains NaN values at indices: {nan_indices}."
+                        f"Critical: Column '{column_name}' is defined as non-nullable but contains NaN values "
+                        f"({nan_positions.size} in total) at indices: {nan_indices}."
                         " These NaN values might be due to original data or conversion errors."
                     )
                     has_critical_error = True # Set critical error flag
@@ -63,13 +119,30 @@ class DataValidator:
 
         return processed_df
 
-    def _validate_enum(self, value: any, valid_enums: list[str]) -> None:
+    @staticmethod
+    def _is_int64_safe(series: pd.Series) -> bool:
+        """
+        Checks that a NaN-free numeric Series can be cast to numpy int64 without losing data.
+
+        Args:
+            series: The numeric Series returned by pd.to_numeric.
+
+        Returns:
+            True if every value is integral and within the int64 range, False otherwise.
+        """
+        if pd.api.types.is_integer_dtype(series.dtype):
+            return True
+        values = series.to_numpy(dtype='float64')
+        return bool(np.all(np.trunc(values) == values) and np.all(np.abs(values) < 2**63))
+
+    def _validate_enum(self, value: any, valid_enums: list[str] | set[str] | frozenset[str]) -> None:
         """
         驗證提供的值是否為有效的枚舉成員。
 
         Args:
             value: 要驗證的值。
-            valid_enums: 有效枚舉值的列表。
+            valid_enums: 有效枚舉值的集合。重複呼叫時請傳入預先建立的 frozenset，
+                成員檢查即為 O(1)；傳入列表仍可運作，但每次檢查為 O(n)。
 
         Raises:
             ValueError: 如果值不是字串，或者值不在有效枚舉列表中。
@@ -79,6 +152,29 @@ class DataValidator:
         if value not in valid_enums:
             raise ValueError(f"'{value}' 是不合法的枚舉值。有效的枚舉值為：{valid_enums}")
 
+    def _validate_enum_series(self, series: pd.Series, valid_enums: frozenset[str]) -> None:
+        """
+        以向量化方式驗證整個欄位的值是否皆為有效的枚舉成員。
+
+        NaN 值會被略過，交由 nullability 檢查處理。
+
+        Args:
+            series: 要驗證的欄位。
+            valid_enums: 有效枚舉值的集合。
+
+        Raises:
+            ValueError: 如果欄位中含有不在有效枚舉集合中的值。
+        """
+        invalid_mask = (~series.isin(valid_enums) & series.notna()).to_numpy()
+        bad_positions = np.flatnonzero(invalid_mask)
+        if bad_positions.size:
+            head = bad_positions[:MAX_ERROR_PREVIEW]
+            raise ValueError(
+                f"{bad_positions.size} 個不合法的枚舉值，前 {len(head)} 個位於索引 "
+                f"{series.index[head].tolist()}：{series.to_numpy()[head].tolist()}。"
+                f"有效的枚舉值為：{sorted(valid_enums)}"
+            )
+
 # Example Usage (optional, for testing)
 if __name__ == '__main__':
     # Sample schema
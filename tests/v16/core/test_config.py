@@ -1,6 +1,7 @@
 import pytest
 import yaml
 import os
+from unittest.mock import patch
 from src.sp_data_v16.core.config import load_config
 
 # Define a temporary config file name for testing
@@ -71,3 +72,49 @@ def test_load_malformed_config(malformed_config_file):
     """ Tests that yaml.YAMLError (or a more specific error) is raised for a malformed config file. """
     with pytest.raises(yaml.YAMLError):
         load_config(str(malformed_config_file))
+
+def test_load_config_uses_json_cache(temp_config_file, monkeypatch):
+    """ Tests that with SP_DATA_CONFIG_CACHE=1 an unchanged config is served from the JSON sidecar without parsing YAML. """
+    monkeypatch.setenv("SP_DATA_CONFIG_CACHE", "1")
+    first = load_config(str(temp_config_file))
+    cache_file = temp_config_file.parent / (temp_config_file.name + ".json.cache")
+    assert cache_file.exists()
+
+    with patch("src.sp_data_v16.core.config.yaml.load") as mock_yaml_load:
+        assert load_config(str(temp_config_file)) == first
+    mock_yaml_load.assert_not_called()
+
+def test_load_config_cache_invalidated_on_same_size_change(temp_config_file, monkeypatch):
+    """ Tests that a same-size edit with the original mtime restored still invalidates the sidecar. """
+    monkeypatch.setenv("SP_DATA_CONFIG_CACHE", "1")
+    assert load_config(str(temp_config_file))["logging"]["level"] == "DEBUG"
+    st = os.stat(temp_config_file)
+    temp_config_file.write_text(temp_config_file.read_text(encoding='utf-8').replace("DEBUG", "ERROR"), encoding='utf-8')
+    os.utime(temp_config_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert os.stat(temp_config_file).st_size == st.st_size
+
+    assert load_config(str(temp_config_file))["logging"]["level"] == "ERROR"
+
+def test_load_config_cache_off_by_default(temp_config_file, monkeypatch):
+    """ Tests that without SP_DATA_CONFIG_CACHE=1 no sidecar is read or written. """
+    monkeypatch.delenv("SP_DATA_CONFIG_CACHE", raising=False)
+    load_config(str(temp_config_file))
+    assert not (temp_config_file.parent / (temp_config_file.name + ".json.cache")).exists()
+
+def test_load_json_config_skips_yaml_and_cache(tmp_path):
+    """ Tests that a ".json" config is read with the json module, without YAML parsing or a sidecar. """
+    config_file_path = tmp_path / "test_config_v16.json"
+    config_file_path.write_text('{"database": {"manifest_db_path": "data/v16/manifest.db"}}', encoding='utf-8')
+
+    with patch("src.sp_data_v16.core.config.yaml.load") as mock_yaml_load:
+        config = load_config(str(config_file_path))
+
+    mock_yaml_load.assert_not_called()
+    assert config == {"database": {"manifest_db_path": "data/v16/manifest.db"}}
+    assert not (tmp_path / "test_config_v16.json.json.cache").exists()
+
+def test_load_json_config_file_not_found(tmp_path):
+    """ Tests that a missing ".json" config raises the same FileNotFoundError as a YAML one. """
+    missing_path = str(tmp_path / "missing_config.json")
+    with pytest.raises(FileNotFoundError, match="Configuration file not found at: "):
+        load_config(missing_path)
@@ -0,0 +1,22 @@
+import os
+import pathlib
+import pytest
+
+def _materialize(tree: dict[str, bytes], root: pathlib.Path):
+    """Writes each file of the tree under root with a single os.open/os.write/os.close."""
+    for rel_path, data in tree.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One open/write/close per file, without pathlib's text-encoding setup
+        fd = os.open(path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+@pytest.fixture(scope="session")
+def materialize_tree():
+    """
+    Provides a function that writes a {relative path: content} tree of files under a root directory.
+    """
+    return _materialize
@@ -2,6 +2,7 @@ import pytest
 import duckdb
 import os
 import datetime
+from unittest.mock import MagicMock, patch
 from src.sp_data_v16.ingestion.manifest import ManifestManager
 
 @pytest.fixture
@@ -97,6 +98,219 @@ def test_register_duplicate_hash_raises_exception(temp_db_manager: ManifestManag
            ("primary key" in error_message_lower or "unique constraint" in error_message_lower)
 
 
+def test_initialize_schema_creates_status_index_in_one_call():
+    """Tests that a new manifest gets its table and status index from a single execute call."""
+    real_connect = duckdb.connect
+    with patch("src.sp_data_v16.ingestion.manifest.duckdb.connect",
+               side_effect=lambda **kwargs: MagicMock(wraps=real_connect(**kwargs))):
+        manager = ManifestManager(db_path=':memory:')
+    try:
+        ddl_calls = [c for c in manager.con.execute.call_args_list if "CREATE" in c.args[0]]
+        assert len(ddl_calls) == 1
+        manager.con.commit.assert_called_once()
+        indexes = manager.con.execute(
+            "SELECT index_name FROM duckdb_indexes() WHERE table_name = 'file_manifest'"
+        ).fetchall()
+        assert ('ix_file_manifest_status',) in indexes
+    finally:
+        manager.close()
+
+
+def test_reopening_existing_manifest_skips_schema_ddl(tmp_path):
+    """Tests that opening an existing manifest keeps its data and issues no CREATE TABLE."""
+    db_file = str(tmp_path / "reopen_manifest.db")
+    first = ManifestManager(db_path=db_file)
+    first.register_file("reopen_hash", "/path/reopen.txt")
+    first.close()
+
+    real_connect = duckdb.connect
+    with patch("src.sp_data_v16.ingestion.manifest.duckdb.connect",
+               side_effect=lambda **kwargs: MagicMock(wraps=real_connect(**kwargs))):
+        second = ManifestManager(db_path=db_file)
+    try:
+        executed_sql = [c.args[0] for c in second.con.execute.call_args_list]
+        assert not any("CREATE TABLE" in sql for sql in executed_sql)
+        second.con.commit.assert_not_called()
+        assert second.hash_exists("reopen_hash")
+    finally:
+        second.close()
+
+
+def test_shared_connection_is_not_closed(tmp_path):
+    """Tests that a ManifestManager given an existing connection leaves it open on close()."""
+    con = duckdb.connect(str(tmp_path / "shared_manifest.db"))
+    try:
+        manager = ManifestManager(db_path=str(tmp_path / "shared_manifest.db"), con=con)
+        manager.register_file("shared_hash", "/path/shared.txt")
+        manager.close()
+        assert con.execute("SELECT COUNT(*) FROM file_manifest").fetchone()[0] == 1
+    finally:
+        con.close()
+
+
+def test_schema_created_despite_file_manifest_in_other_database():
+    """Tests that a file_manifest table in another attached database does not stop schema creation."""
+    con = duckdb.connect(database=':memory:')
+    try:
+        con.execute("ATTACH ':memory:' AS other_db")
+        con.execute("CREATE TABLE other_db.file_manifest (file_hash VARCHAR)")
+        con.execute("CREATE TABLE path_cache (source_path VARCHAR PRIMARY KEY, mtime_ns BIGINT, size BIGINT, file_hash VARCHAR)")
+
+        manager = ManifestManager(db_path=':memory:', con=con)
+        manager.register_file("own_db_hash", "/path/own.txt")
+
+        assert manager.get_file_status("own_db_hash") == 'registered'
+    finally:
+        con.close()
+
+def test_path_cache_created_despite_path_cache_in_other_database():
+    """Tests that a path_cache table in another attached database does not stop path_cache creation."""
+    con = duckdb.connect(database=':memory:')
+    try:
+        con.execute("ATTACH ':memory:' AS other_db")
+        con.execute("CREATE TABLE other_db.path_cache (source_path VARCHAR)")
+        con.execute("CREATE TABLE file_manifest (file_hash VARCHAR PRIMARY KEY, file_path VARCHAR, "
+                    "registration_timestamp TIMESTAMP DEFAULT current_timestamp, status VARCHAR DEFAULT 'registered')")
+
+        manager = ManifestManager(db_path=':memory:', con=con)
+        manager.save_path_cache({"/own.txt": (1, 10, "own_hash")})
+
+        assert manager.load_path_cache() == {"/own.txt": (1, 10, "own_hash")}
+    finally:
+        con.close()
+
+def test_path_cache_round_trip(in_memory_manager: ManifestManager):
+    """Tests that save_path_cache inserts and replaces entries that load_path_cache returns."""
+    assert in_memory_manager.load_path_cache() == {}
+    in_memory_manager.save_path_cache({"/a.txt": (1, 10, "hash_a"), "/b.txt": (2, 20, "hash_b")})
+    in_memory_manager.save_path_cache({"/a.txt": (3, 11, "hash_a2")})
+    assert in_memory_manager.load_path_cache() == {"/a.txt": (3, 11, "hash_a2"), "/b.txt": (2, 20, "hash_b")}
+
+def test_save_path_cache_prunes_unseen_paths_under_scan_root(in_memory_manager: ManifestManager):
+    """Tests that save_path_cache drops entries under scan_root that the scan did not see, and keeps all others."""
+    in_memory_manager.save_path_cache({
+        "/scan/kept.txt": (1, 10, "hash_kept"),
+        "/scan/sub/removed.txt": (2, 20, "hash_removed"),
+        "/scan_other/outside.txt": (3, 30, "hash_sibling"),
+        "/elsewhere/outside.txt": (4, 40, "hash_outside"),
+    })
+
+    in_memory_manager.save_path_cache(
+        {"/scan/new.txt": (5, 50, "hash_new")}, scan_root="/scan", seen_paths={"/scan/kept.txt", "/scan/new.txt"}
+    )
+
+    assert in_memory_manager.load_path_cache() == {
+        "/scan/kept.txt": (1, 10, "hash_kept"),
+        "/scan/new.txt": (5, 50, "hash_new"),
+        "/scan_other/outside.txt": (3, 30, "hash_sibling"),
+        "/elsewhere/outside.txt": (4, 40, "hash_outside"),
+    }
+
+    in_memory_manager.save_path_cache({}, scan_root="/scan", seen_paths=set())
+    assert set(in_memory_manager.load_path_cache()) == {"/scan_other/outside.txt", "/elsewhere/outside.txt"}
+
+
+def test_register_files_batch(in_memory_manager: ManifestManager):
+    """Tests that register_files adds a whole batch, and rejects a batch containing a known hash."""
+    entries = [(f"batch_hash_{i}", f"/path/to/batch_{i}.txt") for i in range(5)]
+    in_memory_manager.register_files(entries)
+
+    rows = in_memory_manager.con.execute("SELECT file_hash, file_path, status FROM file_manifest ORDER BY file_hash").fetchall()
+    assert rows == [(h, p, 'registered') for h, p in entries]
+
+    with pytest.raises(duckdb.ConstraintException):
+        in_memory_manager.register_files([("batch_hash_new", "/path/new.txt"), entries[0]])
+    assert not in_memory_manager.hash_exists("batch_hash_new")
+
+
+def test_unregister_files_removes_entries(in_memory_manager: ManifestManager):
+    """Tests that unregister_files deletes the given hashes and ignores unknown ones."""
+    in_memory_manager.register_files([(f"unreg_hash_{i}", f"/path/unreg_{i}.txt") for i in range(3)])
+
+    in_memory_manager.unregister_files(["unreg_hash_0", "unreg_hash_1", "never_registered"])
+
+    rows = in_memory_manager.con.execute("SELECT file_hash FROM file_manifest").fetchall()
+    assert rows == [("unreg_hash_2",)]
+    assert in_memory_manager.filter_new_hashes(["unreg_hash_0", "unreg_hash_2"]) == {"unreg_hash_0"}
+
+def test_filter_new_hashes_uses_single_query(in_memory_manager: ManifestManager):
+    """Tests that filter_new_hashes checks a whole batch with one query and skips empty batches."""
+    hashes = [f"hash_{i:03d}" for i in range(100)]
+    in_memory_manager.register_files([(h, f"/path/{h}") for h in hashes[:40]])
+
+    in_memory_manager.con = MagicMock(wraps=in_memory_manager.con)
+    new_hashes = in_memory_manager.filter_new_hashes(hashes + hashes[:10])
+
+    assert new_hashes == set(hashes[40:])
+    in_memory_manager.con.execute.assert_called_once()
+    assert in_memory_manager.filter_new_hashes([]) == set()
+    in_memory_manager.con.execute.assert_called_once()
+
+def test_filter_new_hashes_sees_new_registrations(in_memory_manager: ManifestManager):
+    """Tests that files registered after an earlier lookup are reported as known."""
+    assert in_memory_manager.filter_new_hashes(["late_hash"]) == {"late_hash"}
+    in_memory_manager.register_file("late_hash", "/path/late.txt")
+    assert in_memory_manager.hash_exists("late_hash")
+    assert in_memory_manager.filter_new_hashes(["late_hash", "other_hash"]) == {"other_hash"}
+
+def test_shared_connection_sees_hashes_registered_by_other_writers():
+    """Tests that a manager on a shared connection sees hashes another writer adds."""
+    con = duckdb.connect(database=':memory:')
+    try:
+        manager = ManifestManager(db_path=':memory:', con=con)
+        other_writer = ManifestManager(db_path=':memory:', con=con)
+        assert manager.filter_new_hashes(["shared_hash"]) == {"shared_hash"}
+
+        other_writer.register_file("shared_hash", "/path/shared.txt")
+
+        assert manager.hash_exists("shared_hash")
+        assert manager.filter_new_hashes(["shared_hash", "other_hash"]) == {"other_hash"}
+        assert manager.get_file_status("shared_hash") == 'registered'
+    finally:
+        con.close()
+
+def test_update_status_executes_and_commits(in_memory_manager: ManifestManager):
+    """Tests update_status against a plain MagicMock connection (no spec introspection needed)."""
+    mock_con = MagicMock()
+    with patch.object(in_memory_manager, 'con', mock_con):
+        in_memory_manager.update_status("some_hash", "processed")
+
+    mock_con.execute.assert_called_once_with(
+        "UPDATE file_manifest SET status = ? WHERE file_hash = ?", ("processed", "some_hash")
+    )
+    mock_con.commit.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "method, args",
+    [
+        ("hash_exists", ("h",)),
+        ("filter_new_hashes", (["h"],)),
+        ("get_file_status", ("h",)),
+        ("register_file", ("h", "/p")),
+        ("register_files", ([("h", "/p")],)),
+    ]
+)
+def test_db_errors_propagate(in_memory_manager: ManifestManager, method, args):
+    """Tests that DuckDB errors raised by the connection reach the caller."""
+    mock_con = MagicMock()
+    mock_con.execute.side_effect = duckdb.Error("simulated execute failure")
+    mock_con.append.side_effect = duckdb.Error("simulated append failure")
+    with patch.object(in_memory_manager, 'con', mock_con):
+        with pytest.raises(duckdb.Error, match="simulated"):
+            getattr(in_memory_manager, method)(*args)
+    mock_con.commit.assert_not_called()
+
+def test_update_status_db_error_is_reported(in_memory_manager: ManifestManager):
+    """Tests that update_status prints DuckDB errors instead of raising them."""
+    mock_con = MagicMock()
+    mock_con.execute.side_effect = duckdb.Error("simulated execute failure")
+    with patch.object(in_memory_manager, 'con', mock_con), patch('builtins.print') as mock_print:
+        in_memory_manager.update_status("h", "processed")
+    mock_print.assert_called_once()
+    assert "simulated execute failure" in mock_print.call_args.args[0]
+
+
 # Example of an additional test for update_file_status (not explicitly required by issue but good practice)
 def test_update_file_status(temp_db_manager: ManifestManager):
     file_hash = "status_update_hash"
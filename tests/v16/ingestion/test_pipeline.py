@@ -1,44 +1,38 @@
 import pytest
+import contextlib
 import pathlib
-import yaml
+import shutil
 import duckdb
 import hashlib # Added for SHA256 calculation
 from src.sp_data_v16.ingestion.pipeline import IngestionPipeline
 from src.sp_data_v16.ingestion.manifest import ManifestManager # For direct DB check
+from src.sp_data_v16.ingestion.raw_loader import RawLakeLoader
 
-@pytest.fixture
-def temp_pipeline_env(tmp_path: pathlib.Path):
+# Relative path -> content of the dummy input files
+PIPELINE_INPUT_TREE = {
+    "fileA.txt": b"Content of file A",
+    "fileB.log": b"Log data for file B",
+    "subfolder/fileC.dat": b"Binary data for C",
+}
+
+@pytest.fixture(scope="session")
+def pipeline_input_tree(tmp_path_factory, materialize_tree):
     """
-    Sets up a temporary environment for pipeline integration testing:
-    - Temporary input directory with some files.
-    - Temporary data directory for the manifest.db.
-    - Temporary config file pointing to these temporary paths.
+    Creates the dummy input tree once per test session. The pipeline only reads it,
+    so tests share it; a test that needs to modify the inputs must copy it first.
     """
-    # 1. Create temporary directories
-    input_dir = tmp_path / "pipeline_input"
-    input_dir.mkdir()
-
-    data_dir = tmp_path / "pipeline_data" / "v16"
-    data_dir.mkdir(parents=True, exist_ok=True)
-
-    manifest_db_file = data_dir / "manifest.db"
-    raw_lake_db_file = data_dir / "raw_lake.db" # Path for raw_lake.db
-
-    # 2. Create some dummy files in the input directory
-    (input_dir / "fileA.txt").write_text("Content of file A")
-    (input_dir / "fileB.log").write_text("Log data for file B")
-    sub_input_dir = input_dir / "subfolder"
-    sub_input_dir.mkdir()
-    (sub_input_dir / "fileC.dat").write_bytes(b"Binary data for C")
+    input_dir = tmp_path_factory.mktemp("pipeline_input")
+    materialize_tree(PIPELINE_INPUT_TREE, input_dir)
 
     expected_files_count = 3
+    return input_dir, expected_files_count
 
-    # 3. Create a temporary config_v16.yaml
-    temp_config_path = tmp_path / "temp_config_v16.yaml"
-    config_content = {
+def make_pipeline_config(data_dir: pathlib.Path, input_dir: pathlib.Path) -> dict:
+    """Builds a config dict (same layout as config_v16.yaml) for the given data and input directories."""
+    return {
         "database": {
-            "manifest_db_path": str(manifest_db_file),
-            "raw_lake_db_path": str(raw_lake_db_file), # Use the defined path
+            "manifest_db_path": str(data_dir / "manifest.db"),
+            "raw_lake_db_path": str(data_dir / "raw_lake.db"),
             "processed_db_path": str(data_dir / "processed_data.db") # Placeholder
         },
         "logging": {
@@ -49,48 +43,86 @@ def temp_pipeline_env(tmp_path: pathlib.Path):
             "input_directory": str(input_dir)
         }
     }
-    with open(temp_config_path, 'w', encoding='utf-8') as f:
-        yaml.dump(config_content, f)
 
-    return temp_config_path, manifest_db_file, raw_lake_db_file, expected_files_count, input_dir
+@pytest.fixture
+def temp_pipeline_env(tmp_path: pathlib.Path, pipeline_input_tree):
+    """
+    Sets up a temporary environment for pipeline integration testing:
+    - The shared session input directory with some files.
+    - Temporary per-test data directory for manifest.db and raw_lake.db.
+    - A config dict pointing to these paths, passed to IngestionPipeline.from_config
+      so the tests skip writing and parsing YAML.
+    """
+    input_dir, expected_files_count = pipeline_input_tree
 
-def count_manifest_records(db_path: pathlib.Path) -> int:
-    """Helper function to count records in the manifest table."""
-    if not db_path.exists():
-        return 0
-    # Use ManifestManager's connection logic, or connect directly for test simplicity
-    con = None
+    data_dir = tmp_path / "pipeline_data" / "v16"
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    config = make_pipeline_config(data_dir, input_dir)
+
+    return config, data_dir / "manifest.db", data_dir / "raw_lake.db", expected_files_count, input_dir
+
+@contextlib.contextmanager
+def read_only_connections(*db_paths: pathlib.Path):
+    """
+    Opens one read-only DuckDB connection per database file and reuses it for every
+    assertion in the block, instead of reconnecting for each helper call.
+    Connections must be closed before the pipeline writes to the databases again.
+    A single thread is enough for the tiny tables here and skips the thread pool start-up.
+    """
+    cons = [
+        duckdb.connect(database=str(db_path), read_only=True, config={'threads': '1', 'memory_limit': '256MB'})
+        for db_path in db_paths
+    ]
     try:
-        con = duckdb.connect(database=str(db_path), read_only=True)
-        count_result = con.execute("SELECT COUNT(*) FROM file_manifest;").fetchone()
-        return count_result[0] if count_result else 0
-    except Exception as e:
-        print(f"Error counting records: {e}")
-        return -1 # Indicate error
+        yield cons
     finally:
-        if con:
+        for con in cons:
             con.close()
 
-def test_pipeline_run(temp_pipeline_env):
+def count_manifest_records(con: duckdb.DuckDBPyConnection) -> int:
+    """Helper function to count records in the manifest table."""
+    return con.table('file_manifest').count('*').fetchone()[0]
+
+@pytest.fixture
+def pipeline_connections():
+    """
+    Opens one in-memory connection per pipeline DB for the whole test. The pipeline
+    runs reuse them (shared_con / shared_raw_lake_con) and the assertions query them
+    directly, so no database file is touched; durability across reopening is covered
+    separately by test_pipeline_run_persists_to_disk. Closed at teardown.
+    """
+    cons = {
+        "manifest_con": duckdb.connect(database=":memory:"),
+        "raw_lake_con": duckdb.connect(database=":memory:"),
+    }
+    yield cons
+    for con in cons.values():
+        con.close()
+
+def test_pipeline_run(temp_pipeline_env, pipeline_connections):
     """
     Integration test for IngestionPipeline.run().
     Tests initial run (all files new) and a second run (all files should be skipped).
+    Both runs and all assertions share one connection per database.
     """
-    config_path, manifest_db_file, raw_lake_db_file, expected_files_count, input_dir = temp_pipeline_env
+    config, manifest_db_file, raw_lake_db_file, expected_files_count, input_dir = temp_pipeline_env
+    con_manifest = pipeline_connections["manifest_con"]
+    con_raw_lake = pipeline_connections["raw_lake_con"]
 
     # --- First Run ---
-    # print(f"Starting first pipeline run. Config: {config_path}, DB: {manifest_db_file}") # Original line
-    print(f"Starting first pipeline run. Config: {config_path}, Manifest DB: {manifest_db_file}, Raw Lake DB: {raw_lake_db_file}")
-    pipeline_run1 = IngestionPipeline(config_path=str(config_path))
+    print(f"Starting first pipeline run. Manifest DB: {manifest_db_file}, Raw Lake DB: {raw_lake_db_file}")
+    pipeline_run1 = IngestionPipeline.from_config(config, shared_con=con_manifest, shared_raw_lake_con=con_raw_lake)
     pipeline_run1.run() # Errors within run should be caught by pytest if they occur
 
     # Verify manifest content after first run
     # All files should have been registered
-    records_after_run1 = count_manifest_records(manifest_db_file)
-    assert records_after_run1 == expected_files_count,         f"After first run, expected {expected_files_count} records in manifest, found {records_after_run1}"
+    records_after_run1 = count_manifest_records(con_manifest)
+    assert records_after_run1 == expected_files_count, \
+        f"After first run, expected {expected_files_count} records in manifest, found {records_after_run1}"
 
     # Verify Raw Lake content after first run
-    assert count_raw_lake_records(raw_lake_db_file) == expected_files_count, \
+    assert count_raw_lake_records(con_raw_lake) == expected_files_count, \
         "After first run, raw_files table record count mismatch"
 
     # Compare content of one file in Raw Lake
@@ -98,103 +130,159 @@ def test_pipeline_run(temp_pipeline_env):
     file_a_hash = get_file_sha256(file_a_path)
     original_content_a = file_a_path.read_bytes()
 
-    con_raw_lake = None
-    try:
-        con_raw_lake = duckdb.connect(database=str(raw_lake_db_file), read_only=True)
-        result = con_raw_lake.execute("SELECT raw_content FROM raw_files WHERE file_hash = ?", (file_a_hash,)).fetchone()
-        assert result is not None, f"File with hash {file_a_hash} (fileA.txt) not found in raw_lake.db"
-        assert result[0] == original_content_a, "Content of fileA.txt in raw_lake.db does not match original"
-    finally:
-        if con_raw_lake:
-            con_raw_lake.close()
+    result = con_raw_lake.execute("SELECT raw_content FROM raw_files WHERE file_hash = ?", (file_a_hash,)).fetchone()
+    assert result is not None, f"File with hash {file_a_hash} (fileA.txt) not found in raw_lake.db"
+    assert result[0] == original_content_a, "Content of fileA.txt in raw_lake.db does not match original"
 
     print(f"Content of fileA.txt (hash: {file_a_hash[:8]}...) successfully verified in Raw Lake.")
 
     # Verify file statuses in manifest after first run
-    con_manifest = None
-    try:
-        con_manifest = duckdb.connect(database=str(manifest_db_file), read_only=True)
-
-        file_a_path = input_dir / "fileA.txt"
-        file_b_path = input_dir / "fileB.log"
-        file_c_path = input_dir / "subfolder" / "fileC.dat"
+    file_b_path = input_dir / "fileB.log"
+    file_c_path = input_dir / "subfolder" / "fileC.dat"
 
-        expected_hashes_statuses = {
-            get_file_sha256(file_a_path): 'loaded_to_raw_lake',
-            get_file_sha256(file_b_path): 'loaded_to_raw_lake',
-            get_file_sha256(file_c_path): 'loaded_to_raw_lake'
-        }
-
-        actual_statuses = {}
-        records = con_manifest.execute("SELECT file_hash, status FROM file_manifest").fetchall()
-        for record in records:
-            actual_statuses[record[0]] = record[1]
-
-        for f_hash, expected_status in expected_hashes_statuses.items():
-            assert f_hash in actual_statuses, f"Hash {f_hash} not found in manifest."
-            assert actual_statuses[f_hash] == expected_status, \
-                f"For hash {f_hash}, expected status '{expected_status}', got '{actual_statuses[f_hash]}'."
-        print("File statuses successfully verified in manifest after first run.")
+    expected_hashes_statuses = {
+        file_a_hash: 'loaded_to_raw_lake',
+        get_file_sha256(file_b_path): 'loaded_to_raw_lake',
+        get_file_sha256(file_c_path): 'loaded_to_raw_lake'
+    }
 
-    finally:
-        if con_manifest:
-            con_manifest.close()
+    actual_statuses = {}
+    records = con_manifest.execute("SELECT file_hash, status FROM file_manifest").fetchall()
+    for record in records:
+        actual_statuses[record[0]] = record[1]
 
-    # Optional: Check specific statuses or file hashes if needed,
-    # but count is a good primary indicator for this integration test.
+    for f_hash, expected_status in expected_hashes_statuses.items():
+        assert f_hash in actual_statuses, f"Hash {f_hash} not found in manifest."
+        assert actual_statuses[f_hash] == expected_status, \
+            f"For hash {f_hash}, expected status '{expected_status}', got '{actual_statuses[f_hash]}'."
+    print("File statuses successfully verified in manifest after first run.")
 
     # --- Second Run ---
     print("\nStarting second pipeline run (expecting files to be skipped).")
     # Re-initialize pipeline to simulate a new execution context but using the same config/DB
-    pipeline_run2 = IngestionPipeline(config_path=str(config_path))
-    pipeline_run2.run()
+    pipeline_run2 = IngestionPipeline.from_config(config, shared_con=con_manifest, shared_raw_lake_con=con_raw_lake)
+    # Unchanged files must be recognised from the path cache without being re-hashed
+    with patch("src.sp_data_v16.ingestion.scanner._hash_file") as mock_hash_file:
+        pipeline_run2.run()
+    mock_hash_file.assert_not_called()
 
     # Verify manifest content after second run
     # No new files should have been added, so count should remain the same
-    records_after_run2 = count_manifest_records(manifest_db_file)
-    assert records_after_run2 == expected_files_count,         f"After second run, expected {expected_files_count} records (no change), found {records_after_run2}"
+    records_after_run2 = count_manifest_records(con_manifest)
+    assert records_after_run2 == expected_files_count, \
+        f"After second run, expected {expected_files_count} records (no change), found {records_after_run2}"
 
     # Verify Raw Lake content after second run (should also be unchanged)
-    assert count_raw_lake_records(raw_lake_db_file) == expected_files_count, \
+    assert count_raw_lake_records(con_raw_lake) == expected_files_count, \
         "After second run, raw_files table record count should not change"
 
     print("Pipeline integration test completed.")
 
+def test_pipeline_run_persists_to_disk(temp_pipeline_env):
+    """
+    Durability test: each run opens and closes the DB files itself, and the results
+    must be visible when the files are reopened, including to a second run.
+    """
+    config, manifest_db_file, raw_lake_db_file, expected_files_count, _ = temp_pipeline_env
+
+    IngestionPipeline.from_config(config).run()
+    with read_only_connections(manifest_db_file, raw_lake_db_file) as (con_manifest, con_raw_lake):
+        assert count_manifest_records(con_manifest) == expected_files_count
+        assert count_raw_lake_records(con_raw_lake) == expected_files_count
+
+    IngestionPipeline.from_config(config).run()
+    with read_only_connections(manifest_db_file, raw_lake_db_file) as (con_manifest, con_raw_lake):
+        assert count_manifest_records(con_manifest) == expected_files_count
+        assert count_raw_lake_records(con_raw_lake) == expected_files_count
+        statuses = con_manifest.execute("SELECT DISTINCT status FROM file_manifest").fetchall()
+        assert statuses == [('loaded_to_raw_lake',)]
+
+def test_pipeline_run_registers_in_batches(temp_pipeline_env, tmp_path, monkeypatch):
+    """
+    Runs the pipeline with tiny manifest and Raw Lake batches so new files are flushed
+    over several batches, including a file whose content duplicates another one in the same run.
+    """
+    _, manifest_db_file, raw_lake_db_file, expected_files_count, shared_input_dir = temp_pipeline_env
+    # Copy the shared input tree before adding to it
+    input_dir = tmp_path / "batch_input"
+    shutil.copytree(shared_input_dir, input_dir)
+    (input_dir / "fileA_copy.txt").write_text("Content of file A") # Same hash as fileA.txt
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.REGISTER_BATCH_SIZE", 2)
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RAW_LAKE_BATCH_BYTES", 20)
+
+    IngestionPipeline.from_config(make_pipeline_config(manifest_db_file.parent, input_dir)).run()
+
+    with read_only_connections(manifest_db_file, raw_lake_db_file) as (con_manifest, con_raw_lake):
+        assert count_manifest_records(con_manifest) == expected_files_count
+        assert count_raw_lake_records(con_raw_lake) == expected_files_count
+
+def test_pipeline_rerun_stores_files_left_by_failed_write(temp_pipeline_env, monkeypatch):
+    """
+    Fails the second Raw Lake write of a run: files of the failed and later batches must
+    not stay registered without content, so the next run stores all of them.
+    """
+    config, manifest_db_file, raw_lake_db_file, expected_files_count, _ = temp_pipeline_env
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RAW_LAKE_BATCH_SIZE", 1)
+
+    real_save_files_batch = RawLakeLoader.save_files_batch
+    save_calls = []
+    def failing_second_save(self, entries):
+        save_calls.append(entries)
+        if len(save_calls) == 2:
+            raise duckdb.IOException("Simulated Raw Lake write error")
+        return real_save_files_batch(self, entries)
+    monkeypatch.setattr(RawLakeLoader, "save_files_batch", failing_second_save)
+
+    IngestionPipeline.from_config(config).run()
+    with read_only_connections(manifest_db_file, raw_lake_db_file) as (con_manifest, con_raw_lake):
+        assert count_manifest_records(con_manifest) == 1
+        assert count_raw_lake_records(con_raw_lake) == 1
+
+    IngestionPipeline.from_config(config).run()
+    with read_only_connections(manifest_db_file, raw_lake_db_file) as (con_manifest, con_raw_lake):
+        assert count_manifest_records(con_manifest) == expected_files_count
+        assert count_raw_lake_records(con_raw_lake) == expected_files_count
+        statuses = con_manifest.execute("SELECT DISTINCT status FROM file_manifest").fetchall()
+        assert statuses == [('loaded_to_raw_lake',)]
+
+def test_pipeline_rerun_prunes_path_cache_of_removed_files(temp_pipeline_env, tmp_path):
+    """測試檔案自輸入目錄刪除後，下一次執行會移除其 path_cache 紀錄，其他檔案的紀錄則保留。"""
+    _, manifest_db_file, _, expected_files_count, shared_input_dir = temp_pipeline_env
+    # Copy the shared input tree before removing from it
+    input_dir = tmp_path / "prune_input"
+    shutil.copytree(shared_input_dir, input_dir)
+    config = make_pipeline_config(manifest_db_file.parent, input_dir)
+
+    IngestionPipeline.from_config(config).run()
+    (input_dir / "subfolder" / "fileC.dat").unlink()
+    IngestionPipeline.from_config(config).run()
+
+    with read_only_connections(manifest_db_file) as (con_manifest,):
+        cached_paths = {row[0] for row in con_manifest.execute("SELECT source_path FROM path_cache").fetchall()}
+        assert count_manifest_records(con_manifest) == expected_files_count
+    assert cached_paths == {str(input_dir / "fileA.txt"), str(input_dir / "fileB.log")}
+
 # Helper function to count records in raw_lake.db
-def count_raw_lake_records(db_path: pathlib.Path) -> int:
+def count_raw_lake_records(con: duckdb.DuckDBPyConnection) -> int:
     """Helper function to count records in the raw_files table."""
-    if not db_path.exists():
-        return 0
-    con = None
-    try:
-        con = duckdb.connect(database=str(db_path), read_only=True)
-        count_result = con.execute("SELECT COUNT(*) FROM raw_files;").fetchone()
-        return count_result[0] if count_result else 0
-    except Exception as e:
-        print(f"Error counting raw_lake records: {e}")
-        return -1 # Indicate error
-    finally:
-        if con:
-            con.close()
+    return con.table('raw_files').count('*').fetchone()[0]
 
 # Helper function to calculate SHA256 hash (consistent with FileScanner)
 def get_file_sha256(file_path: pathlib.Path) -> str:
     """Calculates the SHA256 hash of a file."""
-    sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 # --- Unit Tests for IngestionPipeline ---
-from unittest.mock import MagicMock, call # 引入 MagicMock 和 call
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch # 引入 MagicMock 和 patch
 
 def test_pipeline_initialization_success(monkeypatch, tmp_path):
     """測試 IngestionPipeline 使用有效設定成功初始化。"""
     mock_config_dict = { # 更名以避免與 pytest 的 config fixture 衝突
         "database": {
-            "manifest_db_path": str(tmp_path / "manifest.db"),
-            "raw_lake_db_path": str(tmp_path / "raw_lake.db")
+            "manifest_db_path": str(tmp_path / "manifest_dir" / "manifest.db"),
+            "raw_lake_db_path": str(tmp_path / "raw_lake_dir" / "raw_lake.db")
         },
         "paths": {
             "input_directory": str(tmp_path / "input")
@@ -204,10 +292,6 @@ def test_pipeline_initialization_success(monkeypatch, tmp_path):
     # Mock load_config
     monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", lambda x: mock_config_dict)
 
-    # Mock pathlib.Path.mkdir
-    mock_mkdir_method = MagicMock() # 更名以避免與 pytest 的 mkdir fixture 衝突
-    monkeypatch.setattr(pathlib.Path, "mkdir", mock_mkdir_method)
-
     # Mock ManifestManager
     mock_mm_instance = MagicMock()
     mock_mm_init = MagicMock(return_value=mock_mm_instance)
@@ -224,25 +308,95 @@ def test_pipeline_initialization_success(monkeypatch, tmp_path):
     assert pipeline.raw_lake_db_path == mock_config_dict["database"]["raw_lake_db_path"]
     assert pipeline.input_directory == mock_config_dict["paths"]["input_directory"]
 
-    # 驗證 mkdir 被呼叫以創建 manifest DB 和 raw lake DB 的父目錄
-    # pathlib.Path("...").parent.mkdir(...)
-    # The mock_mkdir_method is directly patching `pathlib.Path.mkdir`.
-    # The calls would be on the Path objects representing the parent directories.
-    # We expect it to be called for manifest_db_path.parent and raw_lake_db_path.parent
-    assert mock_mkdir_method.call_count == 2
-    # 檢查呼叫的參數 (parents=True, exist_ok=True)
-    # 由於 mock_mkdir_method 會被不同的 Path 實例（即 parent 目錄）呼叫，
-    # 我們可以檢查 calls 列表中的參數
-    calls = [call(parents=True, exist_ok=True), call(parents=True, exist_ok=True)]
-    mock_mkdir_method.assert_has_calls(calls, any_order=False) # 順序可能重要，取決於程式碼
+    # 驗證 manifest DB 和 raw lake DB 的父目錄已被實際建立（在 tmp_path 中執行真實的 mkdir）
+    assert (tmp_path / "manifest_dir").is_dir()
+    assert (tmp_path / "raw_lake_dir").is_dir()
 
     mock_mm_init.assert_called_once_with(db_path=mock_config_dict["database"]["manifest_db_path"])
     mock_rll_init.assert_called_once_with(db_path=mock_config_dict["database"]["raw_lake_db_path"])
 
+def test_pipeline_shared_connection_is_passed_to_manifest_manager(monkeypatch, tmp_path):
+    """測試提供 shared_con 時，ManifestManager 會重用該連線。"""
+    config_dict = {
+        "database": {
+            "manifest_db_path": str(tmp_path / "manifest.db"),
+            "raw_lake_db_path": str(tmp_path / "raw_lake.db")
+        },
+        "paths": {"input_directory": str(tmp_path / "input")}
+    }
+    mock_mm_init = MagicMock()
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", mock_mm_init)
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", MagicMock())
+    shared_con = MagicMock()
+
+    IngestionPipeline.from_config(config_dict, shared_con=shared_con)
+
+    mock_mm_init.assert_called_once_with(db_path=config_dict["database"]["manifest_db_path"], con=shared_con)
+
+def test_pipeline_from_config_skips_config_file(monkeypatch, tmp_path):
+    """測試 IngestionPipeline.from_config 直接使用設定字典，不讀取設定檔。"""
+    config_dict = {
+        "database": {
+            "manifest_db_path": str(tmp_path / "manifest.db"),
+            "raw_lake_db_path": str(tmp_path / "raw_lake.db")
+        },
+        "paths": {"input_directory": str(tmp_path / "input")}
+    }
+    mock_load_config = MagicMock()
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", mock_load_config)
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", MagicMock())
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", MagicMock())
+
+    pipeline = IngestionPipeline.from_config(config_dict)
+
+    mock_load_config.assert_not_called()
+    assert pipeline.config is config_dict
+    assert pipeline.input_directory == config_dict["paths"]["input_directory"]
+
+def test_pipeline_uses_injected_components(tmp_path):
+    """測試注入的 ManifestManager、RawLakeLoader 與掃描器會被直接使用，不會開啟資料庫或建立目錄。"""
+    config_dict = make_pipeline_config(tmp_path / "data", tmp_path / "input")
+    mock_mm, mock_rll, mock_scanner = MagicMock(), MagicMock(), MagicMock()
+
+    pipeline = IngestionPipeline(
+        config=config_dict, manifest_manager=mock_mm, raw_lake_loader=mock_rll, file_scanner=mock_scanner
+    )
+
+    assert pipeline.manifest_manager is mock_mm
+    assert pipeline.raw_loader is mock_rll
+    assert pipeline.file_scanner is mock_scanner
+    assert not (tmp_path / "data").exists()
+
+    pipeline.run()
+
+    mock_mm.close.assert_not_called()
+    mock_rll.close.assert_not_called()
+
+@pytest.mark.parametrize("inject_manifest_manager", [True, False])
+def test_run_closes_only_components_it_created(monkeypatch, tmp_path, inject_manifest_manager):
+    """測試 pipeline.run 結束時只關閉自己建立的 ManifestManager 與 RawLakeLoader。"""
+    created_mm, created_rll, injected = MagicMock(), MagicMock(), MagicMock()
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", MagicMock(return_value=created_mm))
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", MagicMock(return_value=created_rll))
+    mock_scanner = MagicMock()
+    mock_scanner.scan_directory.return_value = iter(())
+    components = {"manifest_manager": injected} if inject_manifest_manager else {"raw_lake_loader": injected}
+
+    IngestionPipeline(
+        config=make_pipeline_config(tmp_path / "data", tmp_path / "input"), file_scanner=mock_scanner, **components
+    ).run()
+
+    injected.close.assert_not_called()
+    if inject_manifest_manager:
+        created_mm.close.assert_not_called()
+        created_rll.close.assert_called_once()
+    else:
+        created_mm.close.assert_called_once()
+        created_rll.close.assert_not_called()
+
 @pytest.mark.parametrize(
     "invalid_config_dict, expected_error_msg_part",
     [
-        (None, "Configuration could not be loaded."),
         ({}, "Configuration could not be loaded."), # An empty dict is False in boolean context
         ({"database": {}}, "Manifest DB path not found in configuration."),
         ({"database": {"manifest_db_path": "dummy_manifest.db"}}, "Input directory path not found in configuration."),
@@ -253,101 +407,101 @@ def test_pipeline_initialization_success(monkeypatch, tmp_path):
          }, "Raw Lake DB path (raw_lake_db_path) not found in configuration."),
     ]
 )
-def test_pipeline_initialization_raises_value_error_on_missing_keys(
-    monkeypatch, tmp_path, invalid_config_dict, expected_error_msg_part
-):
+def test_pipeline_initialization_raises_value_error_on_missing_keys(invalid_config_dict, expected_error_msg_part):
     """測試 IngestionPipeline 初始化時，若設定檔缺少關鍵鍵，會引發 ValueError。"""
-
-    # Mock load_config to return the parameterized invalid config
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", lambda x: invalid_config_dict)
-
-    # Mock pathlib.Path.mkdir as it might be called if some paths are present
-    mock_mkdir_method = MagicMock()
-    monkeypatch.setattr(pathlib.Path, "mkdir", mock_mkdir_method)
-
-    # Mock ManifestManager and RawLakeLoader __init__ as they might be called if initialization proceeds partially
-    mock_mm_init = MagicMock()
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", mock_mm_init)
-    mock_rll_init = MagicMock()
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", mock_rll_init)
-
     with pytest.raises(ValueError) as excinfo:
-        IngestionPipeline(config_path="dummy_config.yaml")
+        IngestionPipeline(config=invalid_config_dict, manifest_manager=MagicMock(), raw_lake_loader=MagicMock())
 
     assert expected_error_msg_part in str(excinfo.value)
 
-def test_run_handles_file_not_found_during_scan(monkeypatch, tmp_path, capsys):
-    """測試在掃描過程中 FileScanner.scan_directory 拋出 FileNotFoundError 時，pipeline.run 能正確處理。"""
-    mock_config_dict = {
-        "database": {
-            "manifest_db_path": str(tmp_path / "manifest.db"),
-            "raw_lake_db_path": str(tmp_path / "raw_lake.db")
-        },
-        "paths": {"input_directory": str(tmp_path / "input")}
-    }
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", lambda x: mock_config_dict)
-    monkeypatch.setattr(pathlib.Path, "mkdir", MagicMock())
+def test_pipeline_initialization_raises_value_error_when_config_file_is_empty(monkeypatch):
+    """測試設定檔內容為空（load_config 回傳 None）時會引發 ValueError。"""
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", lambda x: None)
 
-    # Mock ManifestManager and RawLakeLoader
-    mock_mm_instance = MagicMock()
-    mock_mm_init = MagicMock(return_value=mock_mm_instance)
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", mock_mm_init)
-
-    mock_rll_instance = MagicMock()
-    mock_rll_init = MagicMock(return_value=mock_rll_instance)
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", mock_rll_init)
-
-    # Mock FileScanner.scan_directory to raise FileNotFoundError
-    def mock_scan_directory_raises_fnf(directory_path):
-        raise FileNotFoundError("Simulated FileScanner.scan_directory error")
-        yield # This makes it a generator, which scan_directory is
+    with pytest.raises(ValueError, match="Configuration could not be loaded."):
+        IngestionPipeline(config_path="dummy_config.yaml")
 
-    monkeypatch.setattr("src.sp_data_v16.ingestion.scanner.FileScanner.scan_directory", mock_scan_directory_raises_fnf)
+@pytest.mark.parametrize(
+    "scan_error, expected_message",
+    [
+        (FileNotFoundError("Simulated FileScanner.scan_directory error"),
+         "Error during scanning: Simulated FileScanner.scan_directory error"),
+        (Exception("Simulated generic error in FileScanner.scan_directory"),
+         "An unexpected error occurred during the ingestion run: Simulated generic error in FileScanner.scan_directory"),
+    ]
+)
+def test_run_handles_errors_during_scan(tmp_path, capsys, scan_error, expected_message):
+    """測試掃描過程中拋出 FileNotFoundError 或其他例外時，pipeline.run 能正確處理且不關閉注入的元件。"""
+    mock_mm, mock_rll, mock_scanner = MagicMock(), MagicMock(), MagicMock()
+    mock_scanner.scan_directory.side_effect = scan_error
+    pipeline = IngestionPipeline(
+        config=make_pipeline_config(tmp_path / "data", tmp_path / "input"),
+        manifest_manager=mock_mm, raw_lake_loader=mock_rll, file_scanner=mock_scanner
+    )
 
-    pipeline = IngestionPipeline(config_path="dummy_config.yaml")
     pipeline.run()
 
     captured = capsys.readouterr()
-    assert "Error during scanning: Simulated FileScanner.scan_directory error" in captured.out
+    assert expected_message in captured.out
     assert "Ingestion process aborted." in captured.out
-    # 確保 ManifestManager 和 RawLakeLoader 的 close 被呼叫
-    mock_mm_instance.close.assert_called_once()
-    mock_rll_instance.close.assert_called_once()
-
-def test_run_handles_unexpected_exception_during_scan(monkeypatch, tmp_path, capsys):
-    """測試在掃描過程中 FileScanner.scan_directory 拋出通用 Exception 時，pipeline.run 能正確處理。"""
-    mock_config_dict = {
-        "database": {
-            "manifest_db_path": str(tmp_path / "manifest.db"),
-            "raw_lake_db_path": str(tmp_path / "raw_lake.db")
-        },
-        "paths": {"input_directory": str(tmp_path / "input")}
-    }
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.load_config", lambda x: mock_config_dict)
-    monkeypatch.setattr(pathlib.Path, "mkdir", MagicMock())
-
-    # Mock ManifestManager and RawLakeLoader
+    # 注入的 ManifestManager 和 RawLakeLoader 由呼叫端負責關閉
+    mock_mm.close.assert_not_called()
+    mock_rll.close.assert_not_called()
+
+def test_read_ahead_is_capped_by_bytes(monkeypatch, tmp_path):
+    """測試預讀中的檔案總大小不超過 READ_AHEAD_BYTES，即使檔案數仍低於 READ_AHEAD_FILES。"""
+    new_files = []
+    for i in range(6):
+        file_path = tmp_path / f"file_{i}.bin"
+        file_path.write_bytes(bytes(10))
+        new_files.append((f"hash_{i}", file_path))
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.READ_AHEAD_BYTES", 25)
+
+    outstanding = {"bytes": 0, "max": 0}
+    class TrackingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            outstanding["bytes"] += fn.__self__.stat().st_size
+            outstanding["max"] = max(outstanding["max"], outstanding["bytes"])
+            return super().submit(fn, *args, **kwargs)
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ThreadPoolExecutor", TrackingExecutor)
+
+    results = []
+    for file_hash, file_path, raw_content in IngestionPipeline._read_file_contents(new_files):
+        outstanding["bytes"] -= len(raw_content)
+        results.append((file_hash, file_path))
+
+    assert results == new_files
+    assert outstanding["max"] == 20
+
+def test_run_shuts_down_read_pool_on_write_error(monkeypatch, tmp_path, capsys):
+    """測試寫入 Raw Lake 失敗時，pipeline.run 會回報錯誤並關閉讀檔執行緒池。"""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(5):
+        (input_dir / f"file_{i}.txt").write_text(f"content {i}")
     mock_mm_instance = MagicMock()
-    mock_mm_init = MagicMock(return_value=mock_mm_instance)
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ManifestManager", mock_mm_init)
-
+    mock_mm_instance.load_path_cache.return_value = {}
+    mock_mm_instance.filter_new_hashes.side_effect = lambda hashes: set(hashes)
     mock_rll_instance = MagicMock()
-    mock_rll_init = MagicMock(return_value=mock_rll_instance)
-    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.RawLakeLoader", mock_rll_init)
+    mock_rll_instance.save_files_batch.side_effect = Exception("Simulated Raw Lake write error")
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.READ_AHEAD_FILES", 2)
 
-    # Mock FileScanner.scan_directory to raise a generic Exception
-    def mock_scan_directory_raises_exception(directory_path):
-        raise Exception("Simulated generic error in FileScanner.scan_directory")
-        yield # This makes it a generator
+    executors = []
+    def tracking_executor(*args, **kwargs):
+        executor = ThreadPoolExecutor(*args, **kwargs)
+        executors.append(executor)
+        return executor
+    monkeypatch.setattr("src.sp_data_v16.ingestion.pipeline.ThreadPoolExecutor", tracking_executor)
 
-    monkeypatch.setattr("src.sp_data_v16.ingestion.scanner.FileScanner.scan_directory", mock_scan_directory_raises_exception)
-
-    pipeline = IngestionPipeline(config_path="dummy_config.yaml")
-    pipeline.run()
+    IngestionPipeline(
+        config=make_pipeline_config(tmp_path / "data", input_dir),
+        manifest_manager=mock_mm_instance, raw_lake_loader=mock_rll_instance
+    ).run()
 
     captured = capsys.readouterr()
-    assert "An unexpected error occurred during the ingestion run: Simulated generic error in FileScanner.scan_directory" in captured.out
-    assert "Ingestion process aborted." in captured.out
-    # 確保 ManifestManager 和 RawLakeLoader 的 close 被呼叫
-    mock_mm_instance.close.assert_called_once()
-    mock_rll_instance.close.assert_called_once()
+    assert "An unexpected error occurred during the ingestion run: Simulated Raw Lake write error" in captured.out
+    assert len(executors) == 1
+    assert executors[0]._shutdown
+    mock_mm_instance.update_status.assert_not_called()
+    mock_mm_instance.close.assert_not_called()
+    mock_rll_instance.close.assert_not_called()
@@ -0,0 +1,53 @@
+import pytest
+import duckdb
+from src.sp_data_v16.ingestion.raw_loader import RawLakeLoader
+
+@pytest.fixture
+def raw_loader(tmp_path):
+    """Provides a RawLakeLoader backed by a temporary DB file."""
+    loader = RawLakeLoader(db_path=str(tmp_path / "raw_lake.db"))
+    yield loader
+    loader.close()
+
+def test_save_file_stores_content(raw_loader: RawLakeLoader, tmp_path):
+    """測試 save_file 會將檔案原始內容寫入 raw_files。"""
+    file_path = tmp_path / "input.bin"
+    file_path.write_bytes(b"\x00\x01raw bytes")
+
+    raw_loader.save_file(file_path, "hash_single")
+
+    result = raw_loader.con.execute("SELECT raw_content FROM raw_files WHERE file_hash = ?", ["hash_single"]).fetchone()
+    assert result[0] == b"\x00\x01raw bytes"
+
+def test_save_file_stores_empty_file(raw_loader: RawLakeLoader, tmp_path):
+    """測試 save_file 可以儲存無法 mmap 的空檔案。"""
+    file_path = tmp_path / "empty.bin"
+    file_path.write_bytes(b"")
+
+    raw_loader.save_file(file_path, "hash_empty_file")
+
+    result = raw_loader.con.execute("SELECT raw_content FROM raw_files WHERE file_hash = ?", ["hash_empty_file"]).fetchone()
+    assert result[0] == b""
+
+def test_save_files_batch_stores_all_entries(raw_loader: RawLakeLoader):
+    """測試 save_files_batch 一次寫入整批內容，重複的 hash 會使整批失敗。"""
+    entries = [(f"hash_{i}", f"content {i}".encode()) for i in range(10)] + [("hash_empty", b"")]
+    raw_loader.save_files_batch(entries)
+
+    rows = raw_loader.con.execute("SELECT file_hash, raw_content FROM raw_files").fetchall()
+    assert sorted(rows) == sorted(entries)
+
+    with pytest.raises(duckdb.ConstraintException):
+        raw_loader.save_files_batch([("hash_new", b"new"), entries[0]])
+    assert raw_loader.con.execute("SELECT COUNT(*) FROM raw_files").fetchone()[0] == len(entries)
+
+def test_shared_connection_is_not_closed(tmp_path):
+    """測試使用外部提供的連線時，close() 不會關閉該連線。"""
+    con = duckdb.connect(str(tmp_path / "shared_raw_lake.db"))
+    try:
+        loader = RawLakeLoader(db_path=str(tmp_path / "shared_raw_lake.db"), con=con)
+        loader.save_files_batch([("shared_hash", b"shared")])
+        loader.close()
+        assert con.execute("SELECT COUNT(*) FROM raw_files").fetchone()[0] == 1
+    finally:
+        con.close()
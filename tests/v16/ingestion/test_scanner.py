@@ -1,52 +1,48 @@
 import pytest
 import hashlib
 import pathlib
-from src.sp_data_v16.ingestion.scanner import FileScanner
+import os
+from unittest.mock import MagicMock
+from src.sp_data_v16.ingestion import scanner
+from src.sp_data_v16.ingestion.scanner import FileScanner, THREAD_HASH_MIN_FILES
+
+# Every test builds its own tree under tmp_path, so the module can be sharded freely (pytest -m scanner)
+pytestmark = pytest.mark.scanner
+
+# Relative path -> content of the scan test tree
+SCAN_TEST_TREE = {
+    "file1.txt": b"Content of file1",
+    "file2.dat": b"Binary content for file2",
+    "subdir1/file3.txt": b"Content of file3 in subdir",
+    "empty.txt": b"",
+    "subdir2/another_file.log": b"Log data here",
+}
 
 @pytest.fixture
-def test_files_structure(tmp_path: pathlib.Path):
+def test_files_structure(tmp_path: pathlib.Path, materialize_tree):
     """Creates a temporary directory structure with some files for testing."""
     base_dir = tmp_path / "scan_test_area"
-    base_dir.mkdir()
-
-    # Create some files in the base directory
-    (base_dir / "file1.txt").write_text("Content of file1")
-    (base_dir / "file2.dat").write_bytes(b"Binary content for file2")
-
-    # Create a subdirectory with a file
-    sub_dir = base_dir / "subdir1"
-    sub_dir.mkdir()
-    (sub_dir / "file3.txt").write_text("Content of file3 in subdir")
-
-    # Create an empty file
-    (base_dir / "empty.txt").write_text("")
-
-    # Create another subdirectory, potentially empty or with more files
-    sub_dir2 = base_dir / "subdir2"
-    sub_dir2.mkdir()
-    (sub_dir2 / "another_file.log").write_text("Log data here")
+    materialize_tree(SCAN_TEST_TREE, base_dir)
+    return base_dir
 
-    # Expected files and their content for manual hash calculation if needed
-    # file1.txt: "Content of file1"
-    # file2.dat: b"Binary content for file2"
-    # subdir1/file3.txt: "Content of file3 in subdir"
-    # empty.txt: ""
-    # subdir2/another_file.log: "Log data here"
+@pytest.fixture(scope="session")
+def expected_hashes():
+    """SHA256 of each SCAN_TEST_TREE file, keyed by file name; computed once per session from the known contents."""
+    return {pathlib.PurePath(rel_path).name: hashlib.sha256(data).hexdigest() for rel_path, data in SCAN_TEST_TREE.items()}
 
-    return base_dir
+# Read size for the reference hash. Plain f.read() calls, independent of the scanner's
+# readinto loop over its reused HASH_BUFFER_SIZE buffer
+HASH_READ_SIZE = 1 << 20
 
 def manual_sha256_hash(file_path: pathlib.Path) -> str:
     """Helper function to manually calculate SHA256 hash of a file."""
     hasher = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        while True:
-            chunk = f.read(4096)
-            if not chunk:
-                break
+        while chunk := f.read(HASH_READ_SIZE):
             hasher.update(chunk)
     return hasher.hexdigest()
 
-def test_scan_directory(test_files_structure: pathlib.Path):
+def test_scan_directory(test_files_structure: pathlib.Path, expected_hashes: dict):
     """Tests the FileScanner.scan_directory method."""
 
     results = list(FileScanner.scan_directory(str(test_files_structure)))
@@ -59,8 +55,7 @@ def test_scan_directory(test_files_structure: pathlib.Path):
     scanned_files_map = {path.name: file_hash for file_hash, path in results}
 
     # 2. Manually calculate hash for one file and assert
-    file1_path = test_files_structure / "file1.txt"
-    expected_file1_hash = manual_sha256_hash(file1_path)
+    expected_file1_hash = expected_hashes["file1.txt"]
     assert "file1.txt" in scanned_files_map, "file1.txt not found in scan results"
     assert scanned_files_map["file1.txt"] == expected_file1_hash, "Hash for file1.txt does not match."
 
@@ -76,14 +71,12 @@ def test_scan_directory(test_files_structure: pathlib.Path):
     assert found_paths_set == expected_filenames, "The set of found filenames does not match expected."
 
     # Test scanning empty.txt
-    empty_file_path = test_files_structure / "empty.txt"
-    expected_empty_hash = manual_sha256_hash(empty_file_path)
+    expected_empty_hash = expected_hashes["empty.txt"]
     assert "empty.txt" in scanned_files_map, "empty.txt not found in scan results"
     assert scanned_files_map["empty.txt"] == expected_empty_hash, "Hash for empty.txt does not match."
 
     # Test binary file
-    file2_path = test_files_structure / "file2.dat"
-    expected_file2_hash = manual_sha256_hash(file2_path)
+    expected_file2_hash = expected_hashes["file2.dat"]
     assert "file2.dat" in scanned_files_map, "file2.dat not found in scan results"
     assert scanned_files_map["file2.dat"] == expected_file2_hash, "Hash for file2.dat does not match."
 
@@ -108,3 +101,113 @@ def test_scan_empty_directory(tmp_path: pathlib.Path):
     empty_dir.mkdir()
     results = list(FileScanner.scan_directory(str(empty_dir)))
     assert len(results) == 0, "Scan of empty directory should yield no results."
+
+@pytest.mark.parametrize("file_count", [THREAD_HASH_MIN_FILES, 200])
+def test_scan_directory_hashes_on_thread_pool(tmp_path: pathlib.Path, monkeypatch, file_count):
+    """
+    Tests that any batch of at least THREAD_HASH_MIN_FILES files is hashed on a thread pool
+    that is shut down afterwards, with correct hashes in the same order as a sequential scan.
+    """
+    for i in range(file_count):
+        (tmp_path / f"file_{i:03d}.txt").write_text(f"Content of file {i}")
+    executors = []
+    real_executor = scanner.ThreadPoolExecutor
+    def tracking_executor(*args, **kwargs):
+        executor = real_executor(*args, **kwargs)
+        executors.append(executor)
+        return executor
+    monkeypatch.setattr(scanner, "ThreadPoolExecutor", tracking_executor)
+
+    results = list(FileScanner.scan_directory(str(tmp_path), max_workers=2))
+
+    assert len(results) == file_count
+    assert all(file_hash == manual_sha256_hash(path) for file_hash, path in results)
+    assert len(executors) == 1 and executors[0]._shutdown
+
+    # The pool must not reorder results relative to a sequential scan
+    monkeypatch.setattr(scanner, "THREAD_HASH_MIN_FILES", file_count + 1)
+    assert list(FileScanner.scan_directory(str(tmp_path))) == results
+    assert len(executors) == 1
+
+def test_scan_directory_nested_tree_with_many_files(tmp_path: pathlib.Path):
+    """Tests that the scanner walks a nested 1000-file tree and finds exactly the same files as rglob."""
+    tree_dir = tmp_path / "nested_tree"
+    for i in range(1000):
+        sub_dir = tree_dir / f"level1_{i % 10}" / f"level2_{i % 7}"
+        sub_dir.mkdir(parents=True, exist_ok=True)
+        (sub_dir / f"file_{i:04d}.txt").write_text(f"nested {i}")
+
+    results = list(FileScanner.scan_directory(str(tree_dir)))
+
+    assert len(results) == 1000
+    assert {path for _, path in results} == {f for f in tree_dir.rglob('*') if f.is_file()}
+
+def test_scan_directory_hash_cache(test_files_structure: pathlib.Path):
+    """Tests that unchanged files reuse cached hashes and modified files are re-hashed and re-cached."""
+    hash_cache = {}
+    first = {path: file_hash for file_hash, path in FileScanner.scan_directory(str(test_files_structure), hash_cache=hash_cache)}
+    assert len(hash_cache) == 5
+    assert {h for _, _, h in hash_cache.values()} == set(first.values())
+
+    file1_path = test_files_structure / "file1.txt"
+    file1_path.write_text("Changed content of file1, now longer")
+    # Poison one unchanged entry's hash to prove it is taken from the cache
+    file2_key = str(test_files_structure / "file2.dat")
+    hash_cache[file2_key] = (*hash_cache[file2_key][:2], "cached-hash")
+
+    second = {path: file_hash for file_hash, path in FileScanner.scan_directory(str(test_files_structure), hash_cache=hash_cache)}
+
+    assert second[file1_path] == manual_sha256_hash(file1_path)
+    assert hash_cache[str(file1_path)][2] == second[file1_path]
+    assert second[pathlib.Path(file2_key)] == "cached-hash"
+
+@pytest.mark.parametrize("fadvise_available", [True, False])
+def test_hash_file_advises_sequential_read(tmp_path: pathlib.Path, monkeypatch, fadvise_available):
+    """Tests that hashing advises a sequential read via posix_fadvise, and still hashes correctly where it is unavailable."""
+    file_path = tmp_path / "large.bin"
+    content = b"sequential read hint" * 1000
+    file_path.write_bytes(content)
+    mock_fadvise = MagicMock() if fadvise_available else None
+    monkeypatch.setattr(scanner, "_posix_fadvise", mock_fadvise)
+    if fadvise_available:
+        monkeypatch.setattr(os, "POSIX_FADV_SEQUENTIAL", 2, raising=False)
+
+    path, file_hash, error = scanner._hash_file(str(file_path))
+
+    assert (path, file_hash, error) == (str(file_path), hashlib.sha256(content).hexdigest(), None)
+    if fadvise_available:
+        mock_fadvise.assert_called_once()
+        assert mock_fadvise.call_args.args[1:] == (0, 0, 2)
+
+def test_scan_directory_skips_unreadable_subdirectory(test_files_structure: pathlib.Path, monkeypatch):
+    """Tests that a subdirectory that cannot be listed is skipped, as Path.rglob does, and the other files are still scanned."""
+    blocked_dir = str(test_files_structure / "subdir1")
+    real_scandir = os.scandir
+    def scandir_denying_subdir(path):
+        if str(path) == blocked_dir:
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+    monkeypatch.setattr(scanner.os, "scandir", scandir_denying_subdir)
+
+    scanned_paths = {path for _, path in FileScanner.scan_directory(str(test_files_structure))}
+
+    assert scanned_paths
+    assert all(blocked_dir not in str(path) for path in scanned_paths)
+
+def test_hash_file_reuses_read_buffer(tmp_path: pathlib.Path, monkeypatch):
+    """Tests that files, including one larger than the buffer, share a single read buffer and still hash correctly."""
+    monkeypatch.setattr(scanner, "HASH_BUFFER_SIZE", 64)
+    monkeypatch.setattr(scanner, "_hash_buffers", scanner.threading.local())
+    small_file = tmp_path / "small.bin"
+    small_file.write_bytes(b"short")
+    large_file = tmp_path / "large.bin"
+    large_file.write_bytes(bytes(range(256)) * 3)
+
+    _, small_hash, _ = scanner._hash_file(str(small_file))
+    first_buffer = scanner._get_hash_buffer()
+    _, large_hash, _ = scanner._hash_file(str(large_file))
+
+    assert scanner._get_hash_buffer() is first_buffer
+    assert len(first_buffer) == 64
+    assert small_hash == manual_sha256_hash(small_file)
+    assert large_hash == manual_sha256_hash(large_file)
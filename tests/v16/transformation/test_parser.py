@@ -2,6 +2,9 @@ import pytest
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import numpy as np # For np.nan
+import io
+from unittest.mock import patch
+from src.sp_data_v16.transformation import parser as parser_module
 from src.sp_data_v16.transformation.parser import DataParser
 
 @pytest.fixture(scope="module") # module scope is fine as DataParser is stateless
@@ -184,3 +187,117 @@ def test_parse_fewer_columns_in_data_than_schema(data_parser):
 
     assert result_df is not None
     assert_frame_equal(result_df, expected_df)
+
+@pytest.mark.parametrize(
+    "schema, raw_content",
+    [
+        ({'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A', 'B']}, b"val1,val2\nval3,val4"),
+        ({'encoding': 'big5', 'delimiter': '|', 'columns': ['名稱', '值']}, "測試1|值1\n測試2|值2".encode('big5')),
+        ({'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A', 'B'], 'csv_skip_rows': 1}, b"header1,header2\n1,2\n3,4"),
+    ]
+)
+def test_parse_pyarrow_engine_matches_pandas(data_parser, schema, raw_content):
+    """
+    Tests that csv_engine='pyarrow' produces the same DataFrame as the default pandas path.
+    """
+    expected_df = data_parser.parse(raw_content, schema)
+
+    result_df = data_parser.parse(raw_content, {**schema, 'csv_engine': 'pyarrow'})
+
+    assert result_df is not None
+    assert_frame_equal(result_df, expected_df)
+
+def test_parse_pyarrow_engine_falls_back_on_ragged_rows(data_parser, capsys):
+    """
+    Tests that content Arrow rejects (rows with fewer fields) is parsed by pandas instead.
+    """
+    schema = {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A', 'B', 'C'], 'csv_engine': 'pyarrow'}
+    raw_content = b"val1,val2\nval3"
+    expected_df = pd.DataFrame({'A': ['val1', 'val3'], 'B': ['val2', np.nan], 'C': [np.nan, np.nan]}, columns=['A', 'B', 'C'])
+
+    result_df = data_parser.parse(raw_content, schema)
+
+    assert "falling back to pandas" in capsys.readouterr().out
+    assert_frame_equal(result_df, expected_df)
+
+def test_parse_does_not_decode_whole_content(data_parser):
+    """
+    Tests that the pandas path decodes while reading instead of building a decoded copy of the content.
+    """
+    schema = {'encoding': 'big5', 'delimiter': '|', 'columns': ['名稱', '值']}
+    raw_content = "測試1|值1\n測試2|值2".encode('big5')
+
+    with patch.object(pd, "read_csv", wraps=pd.read_csv) as mock_read_csv:
+        result_df = data_parser.parse(raw_content, schema)
+
+    assert result_df is not None
+    source = mock_read_csv.call_args.args[0]
+    assert not isinstance(source, io.StringIO)
+    assert mock_read_csv.call_args.kwargs["encoding"] == 'big5'
+
+def test_parse_reuses_read_options_per_schema(data_parser):
+    """
+    Tests that read_csv options are built once per schema and reused across parse calls,
+    while each call still gets its own names list, so changes made to one call's
+    options cannot leak into the next.
+    """
+    parser_module._schema_read_csv_kwargs.cache_clear()
+    schema = {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A', 'B']}
+
+    with patch.object(pd, "read_csv", wraps=pd.read_csv) as mock_read_csv:
+        for i in range(3):
+            result_df = data_parser.parse(f"val{i},other{i}".encode(), schema)
+            assert result_df.iloc[0].tolist() == [f"val{i}", f"other{i}"]
+            mock_read_csv.call_args.kwargs["names"].append("leaked")
+
+    cache_info = parser_module._schema_read_csv_kwargs.cache_info()
+    assert (cache_info.misses, cache_info.hits) == (1, 2)
+    names_lists = [call.kwargs["names"] for call in mock_read_csv.call_args_list]
+    assert len({id(names) for names in names_lists}) == 3
+    assert parser_module._read_csv_kwargs(('A', 'B'), 'utf-8', ',')['names'] == ['A', 'B']
+    assert schema['columns'] == ['A', 'B']
+
+@pytest.mark.parametrize(
+    "raw_content, schema",
+    [
+        (b"", {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A']}),
+        (b"a,b", {'encoding': 'utf-8', 'delimiter': ','}),
+        (b"a,b", {'encoding': 'utf-8', 'delimiter': ',', 'columns': []}),
+    ]
+)
+def test_parse_rejects_unparseable_input_before_pandas(data_parser, raw_content, schema):
+    """
+    Tests that empty content and schemas without columns return None without calling pandas.
+    """
+    with patch.object(pd, "read_csv") as mock_read_csv:
+        result_df = data_parser.parse(raw_content, schema)
+
+    assert result_df is None
+    mock_read_csv.assert_not_called()
+
+def test_parse_rejects_wrong_encoding_from_sample(data_parser, monkeypatch):
+    """
+    Tests that content failing to decode in the leading sample is rejected before pandas reads it.
+    """
+    monkeypatch.setattr(parser_module, "ENCODING_SAMPLE_SIZE", 8)
+    schema = {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A']}
+    raw_content = "測試".encode('big5') + b"\nmore,rows\n" * 1000
+
+    with patch.object(pd, "read_csv") as mock_read_csv:
+        result_df = data_parser.parse(raw_content, schema)
+
+    assert result_df is None
+    mock_read_csv.assert_not_called()
+
+def test_parse_accepts_multibyte_character_cut_by_sample(data_parser, monkeypatch):
+    """
+    Tests that a valid multibyte character split at the sample boundary is not treated as an encoding error.
+    """
+    monkeypatch.setattr(parser_module, "ENCODING_SAMPLE_SIZE", 4)
+    schema = {'encoding': 'utf-8', 'delimiter': ',', 'columns': ['A', 'B']}
+    raw_content = "ab測試,值".encode('utf-8') # The sample ends in the middle of '測'
+    expected_df = pd.DataFrame([['ab測試', '值']], columns=['A', 'B'])
+
+    result_df = data_parser.parse(raw_content, schema)
+
+    assert_frame_equal(result_df, expected_df)
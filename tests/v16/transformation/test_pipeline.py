@@ -1,83 +1,191 @@
 import pytest
 import pandas as pd
+import pyarrow as pa
 import duckdb
-import yaml
 import json
 import pathlib
+import shutil
 from src.sp_data_v16.transformation.pipeline import TransformationPipeline
 
-@pytest.fixture(scope="function")
-def transformation_pipeline_env(tmp_path):
+# Seeded DB files copied into each test's environment
+TEMPLATE_DB_FILES = ("manifest.db", "raw_lake.db", "processed.db")
+
+# Written to test_schemas.json by the template fixture
+SCHEMAS_CONTENT = {
+    "csv_valid_data": {
+        "table_name": "valid_data_table",
+        "keywords": ["valid_data_keywords"],
+        "file_type": "csv",
+        "encoding": "utf-8",
+        "delimiter": ",",
+        "csv_skip_rows": 1, # Skip keyword line
+        "unique_key": ["id"], # 加入 unique_key
+        "columns": {
+            "id": {"dtype": "integer", "nullable": False, "db_type": "INTEGER"},
+            "name": {"dtype": "string", "nullable": True, "db_type": "VARCHAR"},
+            "value": {"dtype": "float", "nullable": True, "db_type": "DOUBLE"}
+        }
+    },
+    "csv_validation_error": {
+        "table_name": "validation_error_table",
+        "keywords": ["validation_error_keywords"],
+        "file_type": "csv",
+        "encoding": "utf-8",
+        "delimiter": ",",
+        "csv_skip_rows": 1,
+        "columns": {
+            "id": {"dtype": "integer", "nullable": False}, # This field will cause validation error
+            "description": {"dtype": "string", "nullable": True}
+        }
+    },
+     "csv_parser_error_schema": { # Schema for the file that will cause a CParserError
+        "table_name": "parser_error_table",
+        "keywords": ["parser_error_keywords"],
+        "file_type": "csv",
+        "encoding": "utf-8",
+        "delimiter": ",",
+        "csv_skip_rows": 1,
+        "columns": {
+            "colA": {"dtype": "string"},
+            "colB": {"dtype": "string"}
+        }
+    },
+    "csv_bad_encoding_schema": { # Schema expects utf-8, data will be big5
+        "table_name": "bad_encoding_table",
+        "keywords": ["bad_encoding_keywords"],
+        "file_type": "csv",
+        "encoding": "utf-8", # Schema expects utf-8
+        "delimiter": ",",
+        "csv_skip_rows": 1,
+        "columns": {"key": {"dtype":"string"}, "data":{"dtype":"string"}}
+    }
+}
+
+# Rows seeded into manifest.file_manifest: (file_hash, file_path, status)
+MANIFEST_ROWS = [
+    ('hash_valid_data_csv', '/fake/valid_data.csv', 'loaded_to_raw_lake'),
+    ('hash_validation_err_csv', '/fake/validation_error.csv', 'loaded_to_raw_lake'),
+    ('hash_parser_err_csv', '/fake/parser_error.csv', 'loaded_to_raw_lake'),
+    ('hash_schema_not_found_txt', '/fake/no_schema.txt', 'loaded_to_raw_lake'),
+    ('hash_bad_encoding_csv', '/fake/bad_encoding.csv', 'loaded_to_raw_lake'),
+    ('hash_no_content_csv', '/fake/no_content.csv', 'loaded_to_raw_lake'),
+    ('hash_already_processed_csv', '/fake/already_processed.csv', 'processed')
+]
+
+# Rows seeded into raw_lake.raw_files: (file_hash, raw_content);
+# hash_no_content_csv is intentionally omitted from raw_files table
+RAW_LAKE_ROWS = [
+    ('hash_valid_data_csv', b"valid_data_keywords\n1,Alice,100.5\n2,Bob,200.0\n3,Charlie,NaN"),
+    ('hash_validation_err_csv', b"validation_error_keywords\nnot_an_int,Test Data"), # "not_an_int" for non-nullable integer
+    ('hash_parser_err_csv', b"parser_error_keywords\n\"unterminated_quote,valueA\ncol2,valueB"), # Matches csv_parser_error_schema
+    ('hash_schema_not_found_txt', b"some_random_text_content\nthat_matches_no_schema"),
+    ('hash_bad_encoding_csv', "bad_encoding_keywords\n測試鍵,測試值".encode('big5')), # For csv_bad_encoding_schema (expects utf-8)
+]
+
+@pytest.fixture(scope="session")
+def transformation_env_template(tmp_path_factory):
     """
-    Sets up a temporary environment for TransformationPipeline integration tests.
-    Includes dummy config files, schema files, and databases with pre-populated data.
+    Builds the schema file and the seeded manifest, Raw Lake and processed DB files once
+    per session. Tests receive their own copies through transformation_pipeline_env.
+    """
+    template_dir = tmp_path_factory.mktemp("transformation_env_template")
+    schema_file_path = template_dir / "test_schemas.json"
+
+    manifest_db_path = template_dir / "manifest.db"
+    raw_lake_db_path = template_dir / "raw_lake.db"
+    processed_db_path = template_dir / "processed.db"
+
+    # Create test_schemas.json
+    with open(schema_file_path, 'w', encoding='utf-8') as f:
+        json.dump(SCHEMAS_CONTENT, f)
+
+    # One in-memory host connection with the three DB files attached, instead of a
+    # connection per file; processed.db is created empty by attaching it
+    conn = duckdb.connect()
+    conn.execute(
+        f"ATTACH '{manifest_db_path}' AS manifest; "
+        f"ATTACH '{raw_lake_db_path}' AS raw_lake; "
+        f"ATTACH '{processed_db_path}' AS processed"
+    )
+
+    # Setup manifest.db. Each DB is seeded in one transaction, so one WAL commit per file;
+    # DuckDB lets a transaction write to only one attached database.
+    conn.begin()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS manifest.file_manifest (
+            file_hash VARCHAR PRIMARY KEY,
+            file_path VARCHAR,
+            registration_timestamp TIMESTAMP DEFAULT current_timestamp,
+            status VARCHAR DEFAULT 'registered'
+        );
+    """)
+    # Bulk append (DuckDB's Appender path); by_name lets registration_timestamp take its default.
+    # append() takes an unqualified table name, so select the attached DB first.
+    conn.execute("USE manifest")
+    conn.append(
+        "file_manifest", pd.DataFrame(MANIFEST_ROWS, columns=["file_hash", "file_path", "status"]), by_name=True
+    )
+    conn.commit()
+
+    # Setup raw_lake.db
+    conn.begin()
+    conn.execute("CREATE TABLE IF NOT EXISTS raw_lake.raw_files (file_hash VARCHAR PRIMARY KEY, raw_content BLOB);")
+    # A single-chunk Arrow table with a binary column: one scan, no per-row BLOB binding
+    raw_files_tbl = pa.table({
+        "file_hash": [row[0] for row in RAW_LAKE_ROWS],
+        "raw_content": pa.array([row[1] for row in RAW_LAKE_ROWS], type=pa.binary()),
+    }).combine_chunks()
+    conn.register("raw_files_tbl", raw_files_tbl)
+    conn.execute("INSERT INTO raw_lake.raw_files SELECT * FROM raw_files_tbl")
+    conn.commit()
+    conn.unregister("raw_files_tbl")
+
+    # processed.db stays empty; ProcessedDBLoader will create tables if needed
+    conn.close()
+
+    return {
+        "template_dir": template_dir,
+        "schema_file_path": schema_file_path,
+        "valid_data_table_name": SCHEMAS_CONTENT["csv_valid_data"]["table_name"]
+    }
+
+# Expected manifest status of every seeded file after one pipeline run
+EXPECTED_STATUSES = {
+    'hash_valid_data_csv': 'processed',
+    'hash_validation_err_csv': 'validation_error',
+    'hash_parser_err_csv': 'parse_error_parser_failed',
+    'hash_schema_not_found_txt': 'parse_error_schema_not_identified',
+    'hash_bad_encoding_csv': 'parse_error_parser_failed', # DataParser fails on decode for this
+    'hash_no_content_csv': 'parse_error_no_content',
+    'hash_already_processed_csv': 'processed' # Should remain unchanged
+}
+
+def _build_pipeline_env(base_path: pathlib.Path, template: dict) -> dict:
     """
-    tmp_data_path = tmp_path / "data"
-    tmp_config_path_dir = tmp_path / "config"
+    Copies the template databases under base_path and writes a config pointing at them.
+
+    Args:
+        base_path: An empty directory owned by the caller.
+        template: The transformation_env_template fixture value.
+
+    Returns:
+        The environment dict yielded by transformation_pipeline_env.
+    """
+    tmp_data_path = base_path / "data"
+    tmp_config_path_dir = base_path / "config"
     tmp_data_path.mkdir()
     tmp_config_path_dir.mkdir()
 
-    config_file_path = tmp_config_path_dir / "test_config_v16.yaml"
-    schema_file_path = tmp_config_path_dir / "test_schemas.json"
+    config_file_path = tmp_config_path_dir / "test_config_v16.json"
+    schema_file_path = template["schema_file_path"] # Only read by the pipeline
 
+    for db_file_name in TEMPLATE_DB_FILES:
+        shutil.copyfile(template["template_dir"] / db_file_name, tmp_data_path / db_file_name)
     manifest_db_path = tmp_data_path / "manifest.db"
     raw_lake_db_path = tmp_data_path / "raw_lake.db"
     processed_db_path = tmp_data_path / "processed.db"
 
-    # Create test_schemas.json
-    schemas_content = {
-        "csv_valid_data": {
-            "table_name": "valid_data_table",
-            "keywords": ["valid_data_keywords"],
-            "file_type": "csv",
-            "encoding": "utf-8",
-            "delimiter": ",",
-            "csv_skip_rows": 1, # Skip keyword line
-            "unique_key": ["id"], # 加入 unique_key
-            "columns": {
-                "id": {"dtype": "integer", "nullable": False, "db_type": "INTEGER"},
-                "name": {"dtype": "string", "nullable": True, "db_type": "VARCHAR"},
-                "value": {"dtype": "float", "nullable": True, "db_type": "DOUBLE"}
-            }
-        },
-        "csv_validation_error": {
-            "table_name": "validation_error_table",
-            "keywords": ["validation_error_keywords"],
-            "file_type": "csv",
-            "encoding": "utf-8",
-            "delimiter": ",",
-            "csv_skip_rows": 1,
-            "columns": {
-                "id": {"dtype": "integer", "nullable": False}, # This field will cause validation error
-                "description": {"dtype": "string", "nullable": True}
-            }
-        },
-         "csv_parser_error_schema": { # Schema for the file that will cause a CParserError
-            "table_name": "parser_error_table",
-            "keywords": ["parser_error_keywords"],
-            "file_type": "csv",
-            "encoding": "utf-8",
-            "delimiter": ",",
-            "csv_skip_rows": 1,
-            "columns": {
-                "colA": {"dtype": "string"},
-                "colB": {"dtype": "string"}
-            }
-        },
-        "csv_bad_encoding_schema": { # Schema expects utf-8, data will be big5
-            "table_name": "bad_encoding_table",
-            "keywords": ["bad_encoding_keywords"],
-            "file_type": "csv",
-            "encoding": "utf-8", # Schema expects utf-8
-            "delimiter": ",",
-            "csv_skip_rows": 1,
-            "columns": {"key": {"dtype":"string"}, "data":{"dtype":"string"}}
-        }
-    }
-    with open(schema_file_path, 'w', encoding='utf-8') as f:
-        json.dump(schemas_content, f)
-
-    # Create test_config_v16.yaml
+    # Create test_config_v16.json
     config_content = {
         "database": {
             "manifest_db_path": str(manifest_db_path),
@@ -90,77 +198,49 @@ def transformation_pipeline_env(tmp_path):
         }
     }
     with open(config_file_path, 'w', encoding='utf-8') as f:
-        yaml.dump(config_content, f)
-
-    # Setup manifest.db
-    m_conn = duckdb.connect(str(manifest_db_path))
-    m_conn.execute("""
-        CREATE TABLE IF NOT EXISTS file_manifest (
-            file_hash VARCHAR PRIMARY KEY,
-            file_path VARCHAR,
-            registration_timestamp TIMESTAMP DEFAULT current_timestamp,
-            status VARCHAR DEFAULT 'registered'
-        );
-    """)
-    manifest_test_data = [
-        ('hash_valid_data_csv', '/fake/valid_data.csv', 'loaded_to_raw_lake'),
-        ('hash_validation_err_csv', '/fake/validation_error.csv', 'loaded_to_raw_lake'),
-        ('hash_parser_err_csv', '/fake/parser_error.csv', 'loaded_to_raw_lake'),
-        ('hash_schema_not_found_txt', '/fake/no_schema.txt', 'loaded_to_raw_lake'),
-        ('hash_bad_encoding_csv', '/fake/bad_encoding.csv', 'loaded_to_raw_lake'),
-        ('hash_no_content_csv', '/fake/no_content.csv', 'loaded_to_raw_lake'),
-        ('hash_already_processed_csv', '/fake/already_processed.csv', 'processed')
-    ]
-    for record in manifest_test_data:
-        m_conn.execute("INSERT INTO file_manifest (file_hash, file_path, status) VALUES (?, ?, ?)", record)
-    m_conn.close()
-
-    # Setup raw_lake.db
-    rl_conn = duckdb.connect(str(raw_lake_db_path))
-    rl_conn.execute("CREATE TABLE IF NOT EXISTS raw_files (file_hash VARCHAR PRIMARY KEY, raw_content BLOB);")
-    raw_lake_test_data = [
-        ('hash_valid_data_csv', b"valid_data_keywords\n1,Alice,100.5\n2,Bob,200.0\n3,Charlie,NaN"),
-        ('hash_validation_err_csv', b"validation_error_keywords\nnot_an_int,Test Data"), # "not_an_int" for non-nullable integer
-        ('hash_parser_err_csv', b"parser_error_keywords\n\"unterminated_quote,valueA\ncol2,valueB"), # Matches csv_parser_error_schema
-        ('hash_schema_not_found_txt', b"some_random_text_content\nthat_matches_no_schema"),
-        ('hash_bad_encoding_csv', "bad_encoding_keywords\n測試鍵,測試值".encode('big5')), # For csv_bad_encoding_schema (expects utf-8)
-    ]
-    # hash_no_content_csv is intentionally omitted from raw_files table
-    for record in raw_lake_test_data:
-        rl_conn.execute("INSERT INTO raw_files (file_hash, raw_content) VALUES (?, ?)", record)
-    rl_conn.close()
-
-    # Setup processed.db (empty, ProcessedDBLoader will create tables if needed)
-    p_conn = duckdb.connect(str(processed_db_path)) # Ensure it's created for pipeline init
-    p_conn.close()
-
-    # Expected statuses after pipeline run
-    expected_statuses = {
-        'hash_valid_data_csv': 'processed',
-        'hash_validation_err_csv': 'validation_error',
-        'hash_parser_err_csv': 'parse_error_parser_failed',
-        'hash_schema_not_found_txt': 'parse_error_schema_not_identified',
-        'hash_bad_encoding_csv': 'parse_error_parser_failed', # DataParser fails on decode for this
-        'hash_no_content_csv': 'parse_error_no_content',
-        'hash_already_processed_csv': 'processed' # Should remain unchanged
-    }
+        # load_config reads ".json" configs with the json module, skipping YAML entirely
+        json.dump(config_content, f, indent=2)
 
     # For the original test_find_pending_files
     # It expects 'expected_hashes' for files that are 'loaded_to_raw_lake'
-    expected_hashes_for_find_pending = sorted([
-        'hash_valid_data_csv', 'hash_validation_err_csv', 'hash_parser_err_csv',
-        'hash_schema_not_found_txt', 'hash_bad_encoding_csv', 'hash_no_content_csv'
-    ])
+    expected_hashes_for_find_pending = sorted(
+        file_hash for file_hash, status in EXPECTED_STATUSES.items() if file_hash != 'hash_already_processed_csv'
+    )
 
-    yield {
+    return {
+        "config": config_content, # Pre-parsed; pass to TransformationPipeline.from_config to skip reading the file
         "config_path": str(config_file_path),
         "manifest_db_path": str(manifest_db_path),
         "processed_db_path": str(processed_db_path), # Added for verification
-        "expected_statuses": expected_statuses,
+        "expected_statuses": EXPECTED_STATUSES,
         "expected_hashes_for_find_pending": expected_hashes_for_find_pending,
-        "valid_data_table_name": schemas_content["csv_valid_data"]["table_name"] # Pass for verification
+        "valid_data_table_name": template["valid_data_table_name"] # Pass for verification
     }
-    # tmp_path fixture handles cleanup
+
+@pytest.fixture(scope="function")
+def transformation_pipeline_env(tmp_path, transformation_env_template):
+    """
+    Sets up a temporary environment for TransformationPipeline integration tests.
+    Includes dummy config files, schema files, and databases with pre-populated data.
+    The databases are copies of the session template, so tests may modify them freely.
+    """
+    return _build_pipeline_env(tmp_path, transformation_env_template)
+
+@pytest.fixture(scope="module")
+def pipeline_run_env(tmp_path_factory, transformation_env_template):
+    """
+    An environment on which TransformationPipeline.run() has already been executed once.
+    Shared by the tests in this module that only inspect the results of a run.
+    """
+    env = _build_pipeline_env(tmp_path_factory.mktemp("pipeline_run"), transformation_env_template)
+    TransformationPipeline.from_config(env["config"]).run() # run() closes its connections
+    return env
+
+@pytest.fixture(scope="module")
+def pipeline_run_statuses(pipeline_run_env):
+    """The manifest statuses after the shared pipeline run, read once: file_hash -> status."""
+    with duckdb.connect(pipeline_run_env["manifest_db_path"], read_only=True) as conn:
+        return dict(conn.execute("SELECT file_hash, status FROM file_manifest").fetchall())
 
 def test_find_pending_files(transformation_pipeline_env):
     """
@@ -180,10 +260,11 @@ def test_find_pending_files(transformation_pipeline_env):
         assert len(pending_files_dicts) == len(expected_hashes), \
             f"Expected {len(expected_hashes)} files, but got {len(pending_files_dicts)}"
 
-        returned_hashes = sorted([item['file_hash'] for item in pending_files_dicts])
+        returned_hashes = [item['file_hash'] for item in pending_files_dicts] # Already ordered by file_hash
 
-        assert returned_hashes == expected_hashes, \
-            f"Returned file hashes do not match expected hashes.\nExpected: {expected_hashes}\nGot: {returned_hashes}"
+        # Only the differing hashes are reported on failure; the order check follows
+        assert not set(returned_hashes) ^ set(expected_hashes), set(returned_hashes) ^ set(expected_hashes)
+        assert returned_hashes == expected_hashes, "Pending files are not ordered by file_hash"
 
         # Also check if other columns are present (as per the method's query)
         # and that status is correct for all files returned by find_pending_files
@@ -197,51 +278,57 @@ def test_find_pending_files(transformation_pipeline_env):
         if pipeline:
             pipeline.close()
 
-def test_pipeline_run_updates_statuses(transformation_pipeline_env):
-    """
-    Tests the end-to-end run method of TransformationPipeline and verifies
-    manifest statuses and data loaded into the processed database.
-    """
-    config_path = transformation_pipeline_env["config_path"]
-    manifest_db_path = transformation_pipeline_env["manifest_db_path"]
-    processed_db_path = transformation_pipeline_env["processed_db_path"]
-    expected_statuses = transformation_pipeline_env["expected_statuses"]
-    valid_data_table = transformation_pipeline_env["valid_data_table_name"]
+def test_find_pending_files_df(transformation_pipeline_env):
+    """測試 find_pending_files_df 以 DataFrame 回傳與 find_pending_files 相同的待處理檔案。"""
+    expected_hashes = transformation_pipeline_env["expected_hashes_for_find_pending"]
 
-    pipeline = None
+    pipeline = TransformationPipeline.from_config(transformation_pipeline_env["config"])
     try:
-        pipeline = TransformationPipeline(config_path=config_path)
-        pipeline.run()
-    except Exception as e:
-        pytest.fail(f"Pipeline run failed with an exception: {e}")
+        pending_df = pipeline.find_pending_files_df()
     finally:
-        if pipeline:
-            pipeline.close()
+        pipeline.close()
+
+    assert list(pending_df.columns) == ["file_hash", "file_path", "status", "registration_timestamp"]
+    assert pending_df["file_hash"].tolist() == expected_hashes
+    assert (pending_df["status"] == "loaded_to_raw_lake").all()
 
-    # 1. Verify statuses in manifest.db after run
-    m_conn_check = None
-    queried_statuses = {}
+def test_manifest_manager_shares_pipeline_manifest_connection(transformation_pipeline_env):
+    """測試 ManifestManager 重用 pipeline 的 manifest 連線，而不是再開一個連線到同一個檔案。"""
+    pipeline = TransformationPipeline.from_config(transformation_pipeline_env["config"])
     try:
-        m_conn_check = duckdb.connect(str(manifest_db_path), read_only=True)
-        results = m_conn_check.execute("SELECT file_hash, status FROM file_manifest").fetchall()
-        for row in results:
-            queried_statuses[row[0]] = row[1]
-    except Exception as e:
-        pytest.fail(f"Failed to query manifest DB after pipeline run: {e}")
+        assert pipeline.manifest_manager.con is pipeline.manifest_con
+        pipeline.manifest_manager.update_status('hash_valid_data_csv', 'processed')
+        pending_hashes = {item['file_hash'] for item in pipeline.find_pending_files()}
+        assert 'hash_valid_data_csv' not in pending_hashes
     finally:
-        if m_conn_check:
-            m_conn_check.close()
+        pipeline.close()
 
-    assert queried_statuses == expected_statuses, \
-        f"Mismatch in final manifest statuses.\nExpected: {expected_statuses}\nGot: {queried_statuses}"
+def test_pipeline_run_updates_statuses(pipeline_run_env, pipeline_run_statuses):
+    """
+    Tests the end-to-end run method of TransformationPipeline and verifies
+    manifest statuses and data loaded into the processed database.
+    """
+    processed_db_path = pipeline_run_env["processed_db_path"]
+    expected_statuses = pipeline_run_env["expected_statuses"]
+    valid_data_table = pipeline_run_env["valid_data_table_name"]
+
+    # 1. Verify statuses in manifest.db after run; no file is missing or unexpected.
+    # On failure only the mismatching entries are reported, as {file_hash: (got, expected)}.
+    assert pipeline_run_statuses.keys() == expected_statuses.keys()
+    status_diff = {
+        file_hash: (pipeline_run_statuses[file_hash], expected_status)
+        for file_hash, expected_status in expected_statuses.items()
+        if pipeline_run_statuses[file_hash] != expected_status
+    }
+    assert not status_diff, status_diff
 
-    # 2. Verify content in processed.db for the successfully processed file
-    p_conn_check = None
+    check_conn = duckdb.connect()
     try:
-        p_conn_check = duckdb.connect(str(processed_db_path), read_only=True)
+        check_conn.execute(f"ATTACH '{processed_db_path}' AS processed (READ_ONLY)")
 
+        # 2. Verify content in processed.db for the successfully processed file
         # Check data for 'hash_valid_data_csv'
-        loaded_df = p_conn_check.table(valid_data_table).df()
+        loaded_df = check_conn.table(f"processed.{valid_data_table}").df()
 
         assert len(loaded_df) == 3, f"Expected 3 rows in {valid_data_table}, got {len(loaded_df)}"
 
@@ -267,8 +354,9 @@ def test_pipeline_run_updates_statuses(transformation_pipeline_env):
         # 3. Verify that tables for error files were not created or are empty
         # For this test, we'll just check that the specific validation_error_table is not in the list of tables
         # or if it exists, it's empty. A more robust check might be to list all tables.
-        all_tables_query = p_conn_check.execute("SHOW TABLES;").fetchall()
-        all_table_names = [table[0] for table in all_tables_query]
+        all_table_names = [row[0] for row in check_conn.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = 'processed'"
+        ).fetchall()]
 
         # Table for validation error data should ideally not exist if validation happens before table creation attempt.
         # Or if schema identification fails, or parsing fails.
@@ -280,11 +368,8 @@ def test_pipeline_run_updates_statuses(transformation_pipeline_env):
             f"Table 'parser_error_table' should not exist for parser error case."
         # Add similar checks for tables related to other errorneous files if they have distinct table names in schema
 
-    except Exception as e:
-        pytest.fail(f"Failed to query or verify processed DB: {e}")
     finally:
-        if p_conn_check:
-            p_conn_check.close()
+        check_conn.close()
 
 # --- Unit Tests for TransformationPipeline ---
 from unittest.mock import MagicMock, patch # Added patch here
@@ -400,6 +485,47 @@ def test_pipeline_init_creates_schema_parent_directory(monkeypatch, tmp_path):
     assert non_existent_schema_dir.exists()
     assert non_existent_schema_dir.is_dir()
 
+# Patch targets in the pipeline module, stubbed with successful defaults by _install_default_mocks
+PIPELINE_DEPENDENCIES = (
+    "duckdb.connect", "SchemaManager", "DataParser", "DataValidator",
+    "ProcessedDBLoader", "RawLakeReader", "ManifestManager",
+)
+
+# Parametrize ids of test_pipeline_init_handles_dependency_errors that fail a differently named mock
+DEPENDENCY_MOCK_KEYS = {
+    # The direct duckdb.connect for self.manifest_con; the other components are mocked,
+    # so their internal connects never happen
+    "duckdb.connect_manifest_direct": "duckdb.connect",
+    # ProcessedDBLoader.__init__ raising an error that TransformationPipeline re-raises
+    "ProcessedDBLoader_internal_fail": "ProcessedDBLoader",
+}
+
+def _mock_pipeline_config(tmp_path) -> dict:
+    """A minimal config dict whose paths all point into tmp_path."""
+    return {
+        "database": {
+            "manifest_db_path": str(tmp_path / "manifest.db"),
+            "raw_lake_db_path": str(tmp_path / "raw_lake.db"),
+            "processed_db_path": str(tmp_path / "processed.db")
+        },
+        "paths": {
+            "schema_config_path": str(tmp_path / "schemas.json")
+        }
+    }
+
+def _install_default_mocks(monkeypatch) -> dict:
+    """
+    Replaces every PIPELINE_DEPENDENCIES target with a successful MagicMock.
+
+    Returns:
+        dict: The installed mocks keyed by target, so a test can make one of them fail.
+    """
+    mocks = {}
+    for target in PIPELINE_DEPENDENCIES:
+        mocks[target] = MagicMock(return_value=MagicMock(name=f"{target}_instance"))
+        monkeypatch.setattr(f"src.sp_data_v16.transformation.pipeline.{target}", mocks[target])
+    return mocks
+
 @pytest.mark.parametrize(
     "dependency_to_fail, error_to_raise, expected_exception_type, expected_error_message_part",
     [
@@ -417,62 +543,17 @@ def test_pipeline_init_handles_dependency_errors(
     monkeypatch, tmp_path, dependency_to_fail, error_to_raise, expected_exception_type, expected_error_message_part
 ):
     """測試 TransformationPipeline 初始化時，若依賴項初始化失敗，會拋出相應的錯誤。"""
-    mock_config_dict = {
-        "database": {
-            "manifest_db_path": str(tmp_path / "manifest.db"),
-            "raw_lake_db_path": str(tmp_path / "raw_lake.db"),
-            "processed_db_path": str(tmp_path / "processed.db")
-        },
-        "paths": {
-            "schema_config_path": str(tmp_path / "schemas.json")
-        }
-    }
+    mock_config_dict = _mock_pipeline_config(tmp_path)
     if dependency_to_fail != "SchemaManager":
         (tmp_path / "schemas.json").touch() # Ensure schema file exists
-
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.load_config", lambda x: mock_config_dict)
     monkeypatch.setattr(pathlib.Path, "mkdir", MagicMock())
 
-    # Default successful mocks
-    mock_duckdb_connect_default = MagicMock(return_value=MagicMock(name="default_db_conn"))
-    mock_schema_manager_init_default = MagicMock(return_value=MagicMock(name="schema_manager_instance"))
-    mock_data_parser_init_default = MagicMock(return_value=MagicMock(name="data_parser_instance"))
-    mock_data_validator_init_default = MagicMock(return_value=MagicMock(name="data_validator_instance"))
-    mock_processed_db_loader_init_default = MagicMock(return_value=MagicMock(name="processed_loader_instance"))
-    mock_raw_lake_reader_init_default = MagicMock(return_value=MagicMock(name="raw_lake_reader_instance"))
-    mock_manifest_manager_init_default = MagicMock(return_value=MagicMock(name="manifest_manager_instance"))
-
-    # Assign defaults first, then override the one that should fail
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.duckdb.connect", mock_duckdb_connect_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.SchemaManager", mock_schema_manager_init_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataParser", mock_data_parser_init_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataValidator", mock_data_validator_init_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ProcessedDBLoader", mock_processed_db_loader_init_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.RawLakeReader", mock_raw_lake_reader_init_default)
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ManifestManager", mock_manifest_manager_init_default)
-
-    # Apply failure mock
-    if dependency_to_fail == "RawLakeReader":
-        mock_raw_lake_reader_init_default.side_effect = error_to_raise
-    elif dependency_to_fail == "ManifestManager":
-        mock_manifest_manager_init_default.side_effect = error_to_raise
-    elif dependency_to_fail == "ProcessedDBLoader": # This targets the direct __init__ of ProcessedDBLoader
-        mock_processed_db_loader_init_default.side_effect = error_to_raise
-    elif dependency_to_fail == "SchemaManager":
-        mock_schema_manager_init_default.side_effect = error_to_raise
-    elif dependency_to_fail == "duckdb.connect_manifest_direct":
-        # This makes the duckdb.connect call for self.manifest_con fail
-        # Need to ensure other duckdb.connect calls (e.g. inside other components if not mocked) don't also fail
-        # For this test, other components' __init__ are mocked, so their internal connects won't happen.
-        mock_duckdb_connect_default.side_effect = error_to_raise
-    elif dependency_to_fail == "ProcessedDBLoader_internal_fail":
-        # This is for the case where ProcessedDBLoader.__init__ itself raises an error,
-        # and TransformationPipeline catches it and re-raises.
-        mock_processed_db_loader_init_default.side_effect = error_to_raise
-
+    mocks = _install_default_mocks(monkeypatch)
+    # Only the failing dependency differs between cases
+    mocks[DEPENDENCY_MOCK_KEYS.get(dependency_to_fail, dependency_to_fail)].side_effect = error_to_raise
 
     with pytest.raises(expected_exception_type) as excinfo:
-        TransformationPipeline(config_path="dummy_config.yaml")
+        TransformationPipeline.from_config(mock_config_dict)
 
     # The raised exception e, should be what we simulated.
     # The print statements in TransformationPipeline.__init__ are for logging/debugging,
@@ -730,55 +811,63 @@ def test_run_handles_error_on_final_connection_close(monkeypatch, tmp_path, caps
     mock_pdl_instance.close.assert_called_once()
 
 
-def test_find_pending_files_handles_no_results(monkeypatch, tmp_path):
-    """測試 find_pending_files 在資料庫查詢無結果時返回空列表。"""
-    mock_config_dict = {
-        "database": {
-            "manifest_db_path": str(tmp_path / "manifest.db"),
-            "raw_lake_db_path": str(tmp_path / "raw_lake.db"),
-            "processed_db_path": str(tmp_path / "processed.db")
-        },
-        "paths": {"schema_config_path": str(tmp_path / "schemas.json")}
-    }
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.load_config", lambda x: mock_config_dict)
-    monkeypatch.setattr(pathlib.Path, "mkdir", MagicMock())
+def _pipeline_with_manifest_con(manifest_con) -> TransformationPipeline:
+    """
+    Builds a TransformationPipeline without running __init__, for tests of methods
+    that only touch manifest_con (find_pending_files and find_pending_files_df).
+    """
+    pipeline = TransformationPipeline.__new__(TransformationPipeline)
+    pipeline.manifest_con = manifest_con
+    return pipeline
 
-    # Mock duckdb.connect to return a connection object with a mock execute method
+def test_find_pending_files_handles_no_results():
+    """測試 find_pending_files 在資料庫查詢無結果時返回空列表。"""
     mock_cursor = MagicMock()
-    mock_cursor.fetchall.return_value = [] # No results
-    mock_cursor.description = [('file_hash',), ('file_path',), ('status',), ('registration_timestamp',)] # Mock description
+    mock_cursor.arrow.return_value = pa.table( # No results
+        {name: pa.array([], pa.string()) for name in ('file_hash', 'file_path', 'status', 'registration_timestamp')}
+    )
 
     mock_connection = MagicMock()
     mock_connection.execute.return_value = mock_cursor
+    pipeline = _pipeline_with_manifest_con(mock_connection)
 
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.duckdb.connect", MagicMock(return_value=mock_connection))
-
-    # Mock other dependencies of TransformationPipeline.__init__
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.SchemaManager", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataParser", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataValidator", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ProcessedDBLoader", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.RawLakeReader", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ManifestManager", MagicMock())
-
+    result = pipeline.find_pending_files()
+    assert result == []
+    mock_connection.execute.assert_called_once_with(
+        "SELECT file_hash, file_path, status, registration_timestamp FROM file_manifest WHERE status = 'loaded_to_raw_lake' ORDER BY file_hash"
+    )
+    mock_cursor.arrow.assert_called_once()
 
-    pipeline = TransformationPipeline(config_path="dummy_config.yaml")
-    # Overwrite the specific manifest_con instance after it's created in __init__
-    # This is because __init__ sets self.manifest_con = duckdb.connect(...)
-    # and we want to control the execute method on *that specific connection instance*
-    # for find_pending_files.
-    pipeline.manifest_con = mock_connection # Replace with our controlled mock
+def test_find_pending_files_handles_db_error(capsys):
+    """測試 find_pending_files 在資料庫查詢時發生 duckdb.Error，能返回空列表並記錄錯誤。"""
+    mock_connection = MagicMock()
+    mock_connection.execute.side_effect = duckdb.Error("Simulated DB query error")
+    pipeline = _pipeline_with_manifest_con(mock_connection)
 
     result = pipeline.find_pending_files()
     assert result == []
+
+    captured = capsys.readouterr()
+    assert "Database error in find_pending_files: Simulated DB query error" in captured.out
     mock_connection.execute.assert_called_once_with(
-        "SELECT file_hash, file_path, status, registration_timestamp FROM file_manifest WHERE status = 'loaded_to_raw_lake'"
+        "SELECT file_hash, file_path, status, registration_timestamp FROM file_manifest WHERE status = 'loaded_to_raw_lake' ORDER BY file_hash"
     )
-    mock_cursor.fetchall.assert_called_once()
 
-def test_find_pending_files_handles_db_error(monkeypatch, tmp_path, capsys):
-    """測試 find_pending_files 在資料庫查詢時發生 duckdb.Error，能返回空列表並記錄錯誤。"""
-    mock_config_dict = {
+def test_find_pending_files_df_handles_db_error(capsys):
+    """測試 find_pending_files_df 遇到 duckdb.Error 時回傳具相同欄位的空 DataFrame 並記錄錯誤。"""
+    mock_connection = MagicMock()
+    mock_connection.execute.side_effect = duckdb.Error("Simulated DB query error")
+    pipeline = _pipeline_with_manifest_con(mock_connection)
+
+    result = pipeline.find_pending_files_df()
+
+    assert result.empty
+    assert list(result.columns) == ["file_hash", "file_path", "status", "registration_timestamp"]
+    assert "Database error in find_pending_files_df: Simulated DB query error" in capsys.readouterr().out
+
+def test_pipeline_from_config_skips_config_file(monkeypatch, tmp_path):
+    """測試 TransformationPipeline.from_config 直接使用設定字典，不讀取設定檔。"""
+    config_dict = {
         "database": {
             "manifest_db_path": str(tmp_path / "manifest.db"),
             "raw_lake_db_path": str(tmp_path / "raw_lake.db"),
@@ -786,31 +875,16 @@ def test_find_pending_files_handles_db_error(monkeypatch, tmp_path, capsys):
         },
         "paths": {"schema_config_path": str(tmp_path / "schemas.json")}
     }
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.load_config", lambda x: mock_config_dict)
-    monkeypatch.setattr(pathlib.Path, "mkdir", MagicMock())
-
-    mock_connection = MagicMock()
-    mock_connection.execute.side_effect = duckdb.Error("Simulated DB query error")
-    # duckdb.connect自體被mock以返回這個受控制的mock_connection
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.duckdb.connect", MagicMock(return_value=mock_connection))
-
-    # Mock other dependencies of TransformationPipeline.__init__
+    mock_load_config = MagicMock()
+    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.load_config", mock_load_config)
+    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.duckdb.connect", MagicMock())
     monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.SchemaManager", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataParser", MagicMock())
-    monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.DataValidator", MagicMock())
     monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ProcessedDBLoader", MagicMock())
     monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.RawLakeReader", MagicMock())
     monkeypatch.setattr("src.sp_data_v16.transformation.pipeline.ManifestManager", MagicMock())
 
-    pipeline = TransformationPipeline(config_path="dummy_config.yaml")
-    # 確保 pipeline.manifest_con 是我們的 mock_connection
-    pipeline.manifest_con = mock_connection
-
-    result = pipeline.find_pending_files()
-    assert result == []
+    pipeline = TransformationPipeline.from_config(config_dict)
 
-    captured = capsys.readouterr()
-    assert "Database error in find_pending_files: Simulated DB query error" in captured.out
-    mock_connection.execute.assert_called_once_with(
-        "SELECT file_hash, file_path, status, registration_timestamp FROM file_manifest WHERE status = 'loaded_to_raw_lake'"
-    )
+    mock_load_config.assert_not_called()
+    assert pipeline.config is config_dict
+    assert pipeline.processed_db_path == config_dict["database"]["processed_db_path"]
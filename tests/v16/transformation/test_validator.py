@@ -216,6 +216,24 @@ class TestDataValidator: # 移除 unittest.TestCase 的繼承
         assert pd.isna(validated_df['col_int_nan'].iloc[2]) # None remains NaN
         assert validated_df['col_int_nan'].iloc[3] == 3
 
+    def test_non_nullable_integer_uses_numpy_int64(self):
+        """測試非空整數欄位在沒有 NaN 時使用 numpy int64 而非 Int64。"""
+        df = pd.DataFrame({'col_int': ['1', '2', '3']})
+        schema = {'columns': {'col_int': {'dtype': 'integer', 'nullable': False}}}
+
+        validated_df = self.validator.validate(df.copy(), schema)
+
+        assert validated_df['col_int'].dtype == 'int64'
+        assert validated_df['col_int'].tolist() == [1, 2, 3]
+
+    def test_non_nullable_integer_with_fraction_still_raises(self):
+        """測試非空整數欄位含有小數時，仍與 Int64 轉換一樣引發 TypeError。"""
+        df = pd.DataFrame({'col_int': ['1', '2.5']})
+        schema = {'columns': {'col_int': {'dtype': 'integer', 'nullable': False}}}
+
+        with pytest.raises(TypeError):
+            self.validator.validate(df.copy(), schema)
+
     def test_datetime_conversion_with_mixed_formats_and_errors(self):
         """測試使用多種格式和錯誤處理的日期時間轉換。"""
         # Simplified data to isolate the parsing of '2023-01-03 10:00:00'
@@ -245,6 +263,74 @@ class TestDataValidator: # 移除 unittest.TestCase 的繼承
                     for call in mocked_print.call_args_list)
             ), "未找到或不正確的 'invalid_date' 警告。"
 
+    def test_datetime_conversion_with_format_hint(self):
+        """測試 schema 提供 'format' 提示時，日期時間依該格式解析。"""
+        df = pd.DataFrame({'dt_col': ['2023/01/05', '2023/02/06', 'bad']})
+        schema = {'columns': {'dt_col': {'dtype': 'datetime', 'format': '%Y/%m/%d'}}}
+
+        with patch('builtins.print'):
+            validated_df = self.validator.validate(df.copy(), schema)
+
+        assert validated_df['dt_col'].iloc[0] == pd.Timestamp('2023-01-05')
+        assert validated_df['dt_col'].iloc[1] == pd.Timestamp('2023-02-06')
+        assert pd.isna(validated_df['dt_col'].iloc[2])
+
+    def test_date_conversion_normalizes_time(self):
+        """測試 'date' 類型欄位會移除時間部分。"""
+        df = pd.DataFrame({'d_col': ['2023-01-05 10:30:00', '2023-01-06 23:59:59']})
+        schema = {'columns': {'d_col': {'dtype': 'date'}}}
+
+        validated_df = self.validator.validate(df.copy(), schema)
+
+        assert validated_df['d_col'].tolist() == [pd.Timestamp('2023-01-05'), pd.Timestamp('2023-01-06')]
+
+    def test_conversion_warning_preview_is_bounded(self):
+        """測試轉換錯誤的警告訊息只列出前幾個錯誤值並報告總數。"""
+        df = pd.DataFrame({'col_int': ['1'] + [f'bad{i}' for i in range(50)]})
+        schema = {'columns': {'col_int': {'dtype': 'integer'}}}
+
+        with patch('builtins.print') as mocked_print:
+            self.validator.validate(df.copy(), schema)
+
+        messages = [call.args[0] for call in mocked_print.call_args_list if "could not be converted" in call.args[0]]
+        assert len(messages) == 1
+        assert "First 10 of 50 bad" in messages[0]
+        assert "bad9'" in messages[0]
+        assert "bad10'" not in messages[0]
+
+    def test_wide_schema_numeric_columns_converted(self):
+        """測試多個相同類型的數值欄位皆各自正確轉換。"""
+        df = pd.DataFrame({f'i{n}': ['1', '2', 'x'] for n in range(5)} | {f'f{n}': ['1.5', 'y', '3'] for n in range(5)})
+        schema = {'columns': {**{f'i{n}': {'dtype': 'integer'} for n in range(5)},
+                              **{f'f{n}': {'dtype': 'float'} for n in range(5)}}}
+
+        with patch('builtins.print'):
+            validated_df = self.validator.validate(df.copy(), schema)
+
+        for n in range(5):
+            assert validated_df[f'i{n}'].dtype == 'Int64'
+            assert validated_df[f'i{n}'].iloc[1] == 2
+            assert pd.isna(validated_df[f'i{n}'].iloc[2])
+            assert validated_df[f'f{n}'].dtype == 'float64'
+            assert validated_df[f'f{n}'].iloc[0] == 1.5
+            assert pd.isna(validated_df[f'f{n}'].iloc[1])
+
+    def test_fail_fast_raises_on_first_critical_error(self):
+        """測試 fail_fast=True 時，第一個非空欄位錯誤會立即引發 ValueError。"""
+        df = pd.DataFrame({'first': ['1', None], 'second': ['x', 'y']})
+        schema = {
+            'columns': {
+                'first': {'dtype': 'integer', 'nullable': False},
+                'second': {'dtype': 'integer', 'nullable': False}
+            }
+        }
+
+        with patch('builtins.print'):
+            with pytest.raises(ValueError, match="Column 'first' is defined as non-nullable") as excinfo:
+                self.validator.validate(df.copy(), schema, fail_fast=True)
+
+        assert "'second'" not in str(excinfo.value)
+
     def test_validate_enum_raises_error_on_invalid_type_input(self):
         """測試 _validate_enum 在輸入值非字串時是否引發 ValueError。"""
         valid_enums = ['APPLE', 'BANANA']
@@ -257,5 +343,37 @@ class TestDataValidator: # 移除 unittest.TestCase 的繼承
         with pytest.raises(ValueError, match="'CHERRY' 是不合法的枚舉值。有效的枚舉值為：\\['APPLE', 'BANANA'\\]"):
             self.validator._validate_enum('CHERRY', valid_enums)
 
+    def test_validate_enum_accepts_frozenset(self):
+        """測試 _validate_enum 可接受預先建立的 frozenset。"""
+        valid_enums = frozenset({'APPLE', 'BANANA'})
+        self.validator._validate_enum('APPLE', valid_enums)
+        with pytest.raises(ValueError, match="'CHERRY' 是不合法的枚舉值"):
+            self.validator._validate_enum('CHERRY', valid_enums)
+
+    def test_validate_enum_series_flags_invalid_values(self):
+        """測試 _validate_enum_series 會一次找出欄位中所有不合法的枚舉值，並略過 NaN。"""
+        series = pd.Series(['APPLE', 'CHERRY', None, 'BANANA', 'KIWI'])
+        with pytest.raises(ValueError, match=r"2 個不合法的枚舉值.*\[1, 4\].*\['CHERRY', 'KIWI'\]"):
+            self.validator._validate_enum_series(series, frozenset({'APPLE', 'BANANA'}))
+        self.validator._validate_enum_series(series.iloc[[0, 2, 3]], frozenset({'APPLE', 'BANANA'}))
+
+    def test_validate_enum_column_from_schema(self):
+        """測試 validate 會依 schema 的 enum 清單驗證 'enum' 欄位。"""
+        schema = {'columns': {'fruit': {'dtype': 'enum', 'enum': ['APPLE', 'BANANA'], 'nullable': True}}}
+        valid_df = pd.DataFrame({'fruit': ['APPLE', None, 'BANANA']})
+        invalid_df = pd.DataFrame({'fruit': ['APPLE', 'CHERRY']})
+
+        with patch('builtins.print') as mock_print:
+            result = self.validator.validate(valid_df.copy(), schema)
+            assert result is not None
+            assert_frame_equal(result, valid_df)
+
+            assert self.validator.validate(invalid_df.copy(), schema) is None
+            printed = [c.args[0] for c in mock_print.call_args_list]
+            assert any("Critical: Column 'fruit'" in p and "CHERRY" in p for p in printed)
+
+        with pytest.raises(ValueError, match="Column 'fruit'"):
+            self.validator.validate(invalid_df.copy(), schema, fail_fast=True)
+
 # if __name__ == '__main__':
 #     unittest.main() # 註解掉或移除 unittest.main()